@@ -1,11 +1,29 @@
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-import re
+import os
 import io
-import base64
-from datetime import datetime
+import hashlib
+import importlib.util
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import matplotlib.pyplot as plt
+
+import charts
+import native_charts
+from log_analysis import (
+    DEFAULT_BOT_PATTERNS, STATUS_CLASSES, BotClassifier, build_aggregates, derive_export_columns
+)
+from log_export import EXPORT_CHUNK_ROWS, EXPORT_FORMATS, export_to_file, remove_export
+from log_index import LogFilter, LogIndex
+from log_sketch import SIZE_PERCENTILES, SKETCH_CHUNK_ROWS, build_sketches, iter_chunks
+from log_store import DEFAULT_BACKEND, LogStore, default_store_path
+from log_tail import LogTail
+from log_parser import CHUNK_SIZE, PARSE_ENGINES, format_ipv4, parse_logs, parse_logs_parallel, parse_upload_parallel
+from pipeline_metrics import PipelineMetrics
 
 # Set page configuration
 st.set_page_config(
@@ -27,53 +45,499 @@ st.markdown("""
 6. Alifia Luthfi N. (222410103093)
 """)
 
-# Function to parse logs
-def parse_logs(log_content):
-    log_pattern = re.compile(
-        r'(?P<ip>\d+\.\d+\.\d+\.\d+)\s'                  # IP address
-        r'- - \[(?P<datetime>[^\]]+)\]\s'                 # Timestamp
-        r'"(?P<method>\w+)\s(?P<url>\S+)\sHTTP/\d\.\d"\s' # HTTP Method, URL
-        r'(?P<status>\d{3})\s(?P<size>\d+|-)\s'           # Status code, Size
-        r'"(?P<referrer>[^"]*)"\s'                        # Referrer
-        r'"(?P<user_agent>[^"]*)"'                        # User Agent
-    )
-    
-    log_data = []
-    for line in log_content.split('\n'):
-        if line.strip():  # Skip empty lines
-            match = log_pattern.match(line)
-            if match:
-                entry = match.groupdict()
-                entry['size'] = int(entry['size']) if entry['size'] != '-' else 0
-                log_data.append(entry)
-    
-    # Create DataFrame
-    df = pd.DataFrame(log_data)
-    if not df.empty:
-        df['status'] = df['status'].astype(int)
-        df['datetime'] = pd.to_datetime(df['datetime'], format="%d/%b/%Y:%H:%M:%S %z")
-        # Add hour column for time analysis
-        df['hour'] = df['datetime'].dt.floor('H')
-    
-    return df
+# Parsed logs are cached by a hash of the raw log bytes. Bump PARSER_VERSION
+# whenever the parsed schema changes so that stale files on disk are ignored.
+PARSER_VERSION = 2
+CACHE_DIR = os.environ.get(
+    "LOG_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "web-server-access-logs")
+)
+CACHE_MAX_MB = 512
+CACHE_DISK_MAX_MB = 2048
+HAS_PYARROW = importlib.util.find_spec("pyarrow") is not None
+
+# Out-of-core mode appends parsed logs to one database file (DuckDB, or SQLite
+# without duckdb) that is reused across sessions and restarts
+LOG_STORE_PATH = os.environ.get("LOG_STORE_PATH", default_store_path(CACHE_DIR))
+
+# Function to hash log content (text, bytes, a file path or a binary file-like object) in chunks
+def hash_log_content(log_content, chunk_size=CHUNK_SIZE):
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f"v{PARSER_VERSION}".encode())
+    if isinstance(log_content, Path):
+        with open(log_content, 'rb') as stream:
+            for chunk in iter(lambda: stream.read(chunk_size), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+    if isinstance(log_content, str):
+        log_content = log_content.encode('utf-8')
+    if isinstance(log_content, bytes):
+        digest.update(log_content)
+    else:
+        log_content.seek(0)
+        for chunk in iter(lambda: log_content.read(chunk_size), b''):
+            digest.update(chunk)
+        log_content.seek(0)
+    return digest.hexdigest()
+
+# In-memory LRU cache of parsed DataFrames under a byte budget, backed by Parquet
+# files under a disk budget. It is shared by all sessions, whose scripts run in
+# separate threads, so the entries are only touched while holding the lock.
+class ParsedLogCache:
+    def __init__(self, max_bytes, cache_dir=CACHE_DIR, max_disk_bytes=CACHE_DISK_MAX_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.cache_dir = cache_dir
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.RLock()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.parquet")
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key][0]
+
+        # Fall back to the columns spilled to disk, e.g. after a server restart
+        path = self._path(key)
+        if HAS_PYARROW:
+            try:
+                df = pd.read_parquet(path)
+                # The modification time orders the files for pruning, most recently used last
+                os.utime(path)
+            except FileNotFoundError:
+                return None
+            self._remember(key, df)
+            return df
+        return None
+
+    def put(self, key, df):
+        # Every parsed log is written through to disk, so evicting it from
+        # memory later only drops the in-memory copy
+        if HAS_PYARROW and not os.path.exists(self._path(key)):
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+            df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, self._path(key))
+            self.prune_disk(keep=self._path(key))
+        self._remember(key, df)
+
+    def _remember(self, key, df):
+        size = int(df.memory_usage(deep=True).sum())
+        with self.lock:
+            if key in self.entries:
+                self.total_bytes -= self.entries.pop(key)[1]
+            self.entries[key] = (df, size)
+            self.total_bytes += size
+            self.evict()
+
+    def evict(self):
+        # Keep the most recent entry even if it alone exceeds the budget
+        with self.lock:
+            while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+                _, (_, size) = self.entries.popitem(last=False)
+                self.total_bytes -= size
+
+    def disk_files(self):
+        # Spilled files, least recently used first
+        files = []
+        for entry in os.scandir(self.cache_dir) if os.path.isdir(self.cache_dir) else []:
+            if entry.name.endswith('.parquet'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        return sorted(files)
+
+    def prune_disk(self, keep=None):
+        # Delete the least recently used files until the rest fit the disk budget
+        files = self.disk_files()
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if total <= self.max_disk_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        return total
+
+# The cache lives for the whole server process and is shared by all sessions
+@st.cache_resource
+def get_parsed_log_cache():
+    return ParsedLogCache(CACHE_MAX_MB * 1024 * 1024)
+
+# Function to apply a new memory budget from the Cache Settings
+def set_memory_budget(log_cache):
+    log_cache.max_bytes = st.session_state["cache_max_mb"] * 1024 * 1024
+    log_cache.evict()
+
+# Function to apply a new disk budget from the Cache Settings
+def set_disk_budget(log_cache):
+    log_cache.max_disk_bytes = st.session_state["cache_disk_max_mb"] * 1024 * 1024
+    log_cache.prune_disk()
+
+# Small LRU cache shared by all sessions. Lookups and evictions hold the lock,
+# while values are built outside it so that one slow build does not block the others.
+class LruCache:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return value
+
+# Content hashes of recently seen local files and uploads, shared by all sessions
+CONTENT_KEY_CACHE_SIZE = 256
+
+@st.cache_resource
+def get_content_key_cache():
+    return LruCache(CONTENT_KEY_CACHE_SIZE)
+
+# Function to get the content hash of a log, reading a local file or an upload only the
+# first time it is seen: files are recognized by path, size, modification time and
+# inode, and uploads by their file id
+def log_content_key(log_content):
+    if isinstance(log_content, Path):
+        stat = os.stat(log_content)
+        identity = ('file', os.path.abspath(log_content), stat.st_size, stat.st_mtime_ns, stat.st_ino)
+    elif getattr(log_content, 'file_id', None):
+        identity = ('upload', log_content.file_id)
+    else:
+        return hash_log_content(log_content)
+    cache = get_content_key_cache()
+    return cache.get(identity) or cache.put(identity, hash_log_content(log_content))
+
+# Each session records the stage timings of its own reruns for the Performance panel
+def get_pipeline_metrics():
+    return st.session_state.setdefault("pipeline_metrics", PipelineMetrics())
+
+metrics = get_pipeline_metrics()
+
+# Function to count parsed and unparsed lines; rejected lines are the unparsed
+# ones the regex did not match (the rest had an invalid timestamp or address)
+def count_parse_results(parsed_lines, unparsed_lines, rejected_lines=None):
+    metrics.count("parsed_lines", parsed_lines)
+    metrics.count("unparsed_lines", unparsed_lines)
+    if rejected_lines is not None:
+        metrics.count("rejected_lines", rejected_lines)
+
+# Function to load parsed logs through the cache, parsing only on a miss
+def load_logs(log_content, engine, workers=1):
+    cache = get_parsed_log_cache()
+    with metrics.stage("load: read and hash"):
+        key = log_content_key(log_content)
+    with metrics.stage("load: cache lookup"):
+        df = cache.get(key)
+    metrics.count("parsed_log_cache_hits" if df is not None else "parsed_log_cache_misses")
+    if df is None:
+        # Uploads are decompressed and decoded chunk by chunk while parsing
+        with metrics.stage("load: decode and parse") as run:
+            if workers > 1 and not isinstance(log_content, str):
+                # Parse on several cores, showing progress in the sidebar
+                progress_bar = st.sidebar.progress(0.0, text="Parsing log file...")
+                def show_progress(fraction):
+                    progress_bar.progress(fraction, text=f"Parsing log file... {fraction:.0%}")
+                if isinstance(log_content, Path):
+                    df = parse_logs_parallel(log_content, workers, engine=engine, progress=show_progress)
+                else:
+                    df = parse_upload_parallel(log_content, workers, engine=engine, progress=show_progress)
+                progress_bar.empty()
+            else:
+                df = parse_logs(log_content, engine=engine)
+            run.rows = len(df) + df.attrs['unparsed_lines']
+        count_parse_results(len(df), df.attrs['unparsed_lines'], df.attrs['rejected_lines'])
+        with metrics.stage("load: cache write"):
+            cache.put(key, df)
+    # Hand out a shallow copy so that derived columns never leak into the cache
+    return df.copy(deep=False), key
+
+# Aggregates are small, so a handful of recent datasets is kept per process
+AGGREGATE_CACHE_SIZE = 8
+
+@st.cache_resource
+def get_aggregate_cache():
+    return LruCache(AGGREGATE_CACHE_SIZE)
+
+# Function to get the precomputed aggregates of a dataset (a DataFrame or a log store), building them once.
+# Without exact counts (when sketches are shown instead), a DataFrame's URL and IP counts are left out.
+def load_aggregates(key, source, filters=None, exact_counts=True):
+    cache = get_aggregate_cache()
+    if not exact_counts and isinstance(source, pd.DataFrame):
+        key = ("approximate", key)
+    aggregates = cache.get(key)
+    metrics.count("aggregate_cache_hits" if aggregates is not None else "aggregate_cache_misses")
+    if aggregates is None:
+        with metrics.stage("aggregate: summaries", len(source) if isinstance(source, pd.DataFrame) else None):
+            aggregates = (build_aggregates(source, exact_counts) if isinstance(source, pd.DataFrame)
+                          else source.aggregates(filters))
+        cache.put(key, aggregates)
+    return aggregates
+
+# Function to get the approximate sketches of a dataset (a DataFrame or a log store), building them once
+def load_sketches(key, source, filters=None):
+    cache = get_aggregate_cache()
+    key = ("sketches", key)
+    sketches = cache.get(key)
+    metrics.count("aggregate_cache_hits" if sketches is not None else "aggregate_cache_misses")
+    if sketches is None:
+        frames = iter_chunks(source) if isinstance(source, pd.DataFrame) else source.iter_frames(SKETCH_CHUNK_ROWS, filters)
+        with metrics.stage("aggregate: sketches") as run:
+            sketches = build_sketches(frames)
+            run.rows = sketches.total_requests
+        cache.put(key, sketches)
+    return sketches
+
+# Rendered chart images are kept per (chart, dataset, filters, parameters), so a
+# rerun that changes nothing about a chart only resends its PNG
+CHART_CACHE_SIZE = 64
+CHART_DPI = 144
+CHART_BACKENDS = ["Matplotlib (cached images)", "Vega-Lite (rendered in the browser)"]
+
+@st.cache_resource
+def get_chart_cache():
+    return LruCache(CHART_CACHE_SIZE)
+
+# pyplot keeps global state, so sessions take turns drawing figures
+@st.cache_resource
+def get_chart_lock():
+    return threading.Lock()
+
+# Function to render a matplotlib chart to PNG bytes once, closing its figure afterwards
+def render_chart_png(key, chart_name, data):
+    cache = get_chart_cache()
+    png = cache.get(key)
+    metrics.count("chart_cache_hits" if png is not None else "chart_cache_misses")
+    if png is None:
+        with get_chart_lock():
+            fig = getattr(charts, chart_name)(data)
+            try:
+                image = io.BytesIO()
+                fig.savefig(image, format='png', dpi=CHART_DPI, bbox_inches='tight')
+            finally:
+                plt.close(fig)
+        png = cache.put(key, image.getvalue())
+    return png
+
+# Function to show one of the dashboard charts with the selected backend
+def show_chart(chart_name, data, key):
+    with metrics.stage(f"render: {chart_name}"):
+        if chart_backend == CHART_BACKENDS[1]:
+            st.altair_chart(getattr(native_charts, chart_name)(data))
+        else:
+            st.image(render_chart_png((chart_name,) + key, chart_name, data))
+
+# Time-sorted indexes hold a reference to their rows, so only a few are kept
+LOG_INDEX_CACHE_SIZE = 4
+
+@st.cache_resource
+def get_log_index_cache():
+    return LruCache(LOG_INDEX_CACHE_SIZE)
+
+# Function to get the filtering index of a dataset, building it once
+def load_log_index(key, df):
+    cache = get_log_index_cache()
+    index = cache.get(key)
+    if index is None:
+        with metrics.stage("filter: build index", len(df)):
+            index = cache.put(key, LogIndex(df))
+    return index
+
+# Bot verdicts per user agent are memoized for the most recent pattern lists across reruns
+BOT_CLASSIFIER_CACHE_SIZE = 8
+
+@st.cache_resource(max_entries=BOT_CLASSIFIER_CACHE_SIZE)
+def get_bot_classifier(patterns):
+    return BotClassifier(patterns)
+
+# The log store connection is shared by all sessions
+@st.cache_resource
+def get_log_store(path):
+    return LogStore(path)
+
+# Function to append a log to the store, skipping logs that were stored before
+def ingest_log(log_store, log_content, name, engine):
+    key = log_content_key(log_content)
+    if log_store.has_source(key):
+        return 0
+    progress_text = st.sidebar.empty()
+    def show_progress(rows):
+        progress_text.caption(f"Storing {name}... {rows:,} log entries")
+    with metrics.stage("load: decode, parse and store") as run:
+        rows = run.rows = log_store.ingest(log_content, key, name, engine=engine, progress=show_progress)
+    progress_text.empty()
+    # The store keeps the number of unparsed lines per log, but not how many the regex rejected
+    source = log_store.sources().set_index('key').loc[key]
+    count_parse_results(rows, int(source['unparsed_lines']))
+    return rows
+
+# Each session follows its own file, so the tail lives in the session state. Only the
+# file being followed is kept: selecting another one closes the previous tail.
+def get_log_tail(path, engine):
+    current = st.session_state.get("log_tail")
+    if current is None or current[0] != (path, engine):
+        if current is not None:
+            current[1].close()
+        current = st.session_state["log_tail"] = ((path, engine), LogTail(path, engine=engine))
+    return current[1]
 
 # Sidebar for file upload and options
 st.sidebar.header("Upload and Options")
 
 # File upload option
-uploaded_file = st.sidebar.file_uploader("Upload Access Log File", type=["log", "txt"])
+uploaded_file = st.sidebar.file_uploader("Upload Access Log File", type=["log", "txt", "gz"])
+
+# Local file option, for logs that already live on the server
+log_path = st.sidebar.text_input("Or Read a Log File from a Local Path", placeholder="/var/log/nginx/access.log")
+
+# Live tail option: keep following the local file and parse only appended lines
+follow_file = False
+refresh_interval = 0
+if log_path:
+    follow_file = st.sidebar.checkbox("Follow File (Live Tail)", value=False)
+    if follow_file:
+        refresh_interval = st.sidebar.number_input("Auto-Refresh Every (Seconds, 0 = Off)", min_value=0, value=0)
+        st.sidebar.button("Refresh Now")
 
 # Example data option
 use_example_data = st.sidebar.checkbox("Use Example Data", value=True)
 
+# Parsing engine option
+parse_engine = st.sidebar.selectbox(
+    "Parsing Engine", list(PARSE_ENGINES),
+    help="Both engines parse at about the same speed. The batch engine needs slightly more memory while parsing."
+)
+
+# Parallel parsing option
+parallel_parsing = st.sidebar.checkbox("Parallel Parsing", value=False)
+parse_workers = 1
+if parallel_parsing:
+    parse_workers = int(st.sidebar.number_input("Worker Processes", min_value=2, value=max(os.cpu_count() or 2, 2)))
+
+# Out-of-core option: keep parsed logs in an on-disk database and answer the views with SQL
+use_log_store = st.sidebar.checkbox(
+    "Out-of-Core Mode (Log Store)", value=False,
+    help="Append uploaded and local logs to a database file instead of holding them in memory"
+)
+if use_log_store and follow_file:
+    st.sidebar.caption("The live tail keeps its log in memory; the log store is not used while following a file.")
+
+# Approximate option: bounded-memory sketches instead of exact counts of every distinct value
+use_sketches = st.sidebar.checkbox(
+    "Approximate Analytics (Sketches)", value=False,
+    help="HyperLogLog for unique IPs, Space-Saving for top URLs and IPs, t-digest for response size percentiles"
+)
+
+# Chart option: server-rendered matplotlib images, or Vega-Lite specs drawn by the browser
+chart_backend = st.sidebar.selectbox("Chart Backend", CHART_BACKENDS)
+
+# Bot detection option: extra user agent substrings that mark a request as a bot
+extra_bot_patterns = st.sidebar.text_input(
+    "Additional Bot Patterns", placeholder="e.g. python-requests, curl",
+    help=f"Comma-separated, added to: {', '.join(DEFAULT_BOT_PATTERNS)}"
+)
+bot_patterns = tuple(dict.fromkeys(
+    DEFAULT_BOT_PATTERNS + [pattern.strip().lower() for pattern in extra_bot_patterns.split(',') if pattern.strip()]
+))
+bot_classifier = get_bot_classifier(bot_patterns)
+
+# Parsed log cache options
+with st.sidebar.expander("Cache Settings"):
+    log_cache = get_parsed_log_cache()
+    # The budgets are shared by all sessions, so they are only applied when a user changes them
+    st.number_input(
+        "Memory budget (MB)", min_value=16, value=log_cache.max_bytes // 1024 // 1024, step=64,
+        key="cache_max_mb", on_change=set_memory_budget, args=(log_cache,)
+    )
+    st.caption(
+        f"{len(log_cache.entries)} parsed logs in memory "
+        f"({log_cache.total_bytes / 1024 / 1024:.1f} MB)"
+    )
+    if HAS_PYARROW:
+        st.number_input(
+            "Disk budget (MB)", min_value=64, value=log_cache.max_disk_bytes // 1024 // 1024, step=256,
+            key="cache_disk_max_mb", on_change=set_disk_budget, args=(log_cache,)
+        )
+        disk_files = log_cache.disk_files()
+        disk_bytes = sum(size for _, size, _ in disk_files)
+        st.caption(f"{len(disk_files)} parsed logs on disk ({disk_bytes / 1024 / 1024:.1f} MB)")
+    else:
+        st.caption("Install pyarrow to keep parsed logs on disk across restarts.")
+
+# Log store contents and options
+if use_log_store:
+    with st.sidebar.expander("Log Store"):
+        log_store = get_log_store(LOG_STORE_PATH)
+        st.caption(f"{DEFAULT_BACKEND} database at {LOG_STORE_PATH}")
+        st.dataframe(log_store.sources()[['name', 'rows', 'ingested_at']], hide_index=True)
+        if st.button("Clear Log Store"):
+            log_store.clear()
+
 # Load data
 df = None
+aggregates = None
+log_store = None
+log_tail = None
 
-if uploaded_file is not None:
-    # Read uploaded file
-    log_content = uploaded_file.getvalue().decode("utf-8")
-    df = parse_logs(log_content)
+if use_log_store and not follow_file:
+    # Add the uploaded or local log to the store, then summarize everything stored so far
+    log_store = get_log_store(LOG_STORE_PATH)
+    if uploaded_file is not None:
+        uploaded_file.seek(0)
+        ingest_log(log_store, uploaded_file, uploaded_file.name, parse_engine)
+    elif log_path and os.path.isfile(log_path):
+        ingest_log(log_store, Path(log_path), log_path, parse_engine)
+    elif log_path:
+        st.sidebar.error(f"File not found: {log_path}")
+    dataset_key = log_store.key
+    aggregates = load_aggregates(dataset_key, log_store)
+    st.sidebar.success(f"Log store holds {aggregates.total_requests:,} log entries")
+elif uploaded_file is not None:
+    # Parse the uploaded file in chunks (plain text or gzip-compressed)
+    uploaded_file.seek(0)
+    df, dataset_key = load_logs(uploaded_file, engine=parse_engine, workers=parse_workers)
     st.sidebar.success(f"Successfully loaded {len(df)} log entries")
+elif log_path:
+    # Read the log file from local disk
+    if os.path.isfile(log_path) and follow_file:
+        # Parse only the lines appended since the last refresh
+        log_tail = get_log_tail(log_path, parse_engine)
+        unparsed_before, rejected_before = log_tail.unparsed_lines, log_tail.rejected_lines
+        with metrics.stage("load: tail refresh") as run:
+            new_entries = run.rows = log_tail.refresh()
+        count_parse_results(
+            new_entries, log_tail.unparsed_lines - unparsed_before, log_tail.rejected_lines - rejected_before
+        )
+        # The tail keeps its rows, time index and aggregates up to date with each refresh
+        df, dataset_key, aggregates = log_tail.frame(), log_tail.key, log_tail.aggregates
+        st.sidebar.success(
+            f"Following {log_path}: {0 if aggregates is None else aggregates.total_requests:,} "
+            f"log entries ({new_entries:,} new)"
+        )
+    elif os.path.isfile(log_path):
+        df, dataset_key = load_logs(Path(log_path), engine=parse_engine, workers=parse_workers)
+        st.sidebar.success(f"Successfully loaded {len(df)} log entries")
+    else:
+        st.sidebar.error(f"File not found: {log_path}")
 elif use_example_data:
     # Generate some sample data based on patterns from the original file
     sample_logs = """
@@ -118,51 +582,130 @@ elif use_example_data:
 5.237.18.117 - - [12/Jan/2020:14:23:05 +0000] "GET /server-error HTTP/1.1" 500 987 "https://example.com/services" "Mozilla/5.0 (Linux; Android 9; SM-G950F)"
 66.249.66.91 - - [12/Jan/2020:14:24:20 +0000] "GET /image/support HTTP/1.1" 499 0 "https://example.com/contact" "Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)"
 """
-    df = parse_logs(sample_logs)
+    df, dataset_key = load_logs(sample_logs, engine=parse_engine)
     st.sidebar.info(f"Using example data with {len(df)} log entries")
 
-# Proceed only if data is loaded
-if df is not None and not df.empty:
+unparsed_lines = log_store.unparsed_lines if log_store is not None else df.attrs.get('unparsed_lines') if df is not None else 0
+if unparsed_lines:
+    st.sidebar.warning(f"Skipped {unparsed_lines:,} lines that did not match the log format")
+
+# Filters narrow every view below
+filters = LogFilter()
+log_index = None
+if (df is not None and not df.empty) or (log_store is not None and aggregates.total_requests):
+    # Summaries of the whole dataset, computed once (or kept up to date by the live tail)
+    if df is not None:
+        # Rows are kept sorted by time, so a time window is a binary search
+        log_index = log_tail.index() if log_tail is not None else load_log_index(dataset_key, df)
+        if aggregates is None:
+            aggregates = load_aggregates(dataset_key, df, exact_counts=not use_sketches)
+    
+    with st.sidebar.expander("Filters"):
+        first, last = log_index.time_bounds() if log_index is not None else log_store.time_bounds()
+        step = timedelta(minutes=1) if last - first <= timedelta(days=2) else timedelta(hours=1)
+        window_start, window_end = first.floor(step), last.floor(step) + step
+        time_window = st.slider(
+            "Time Window",
+            min_value=window_start.tz_localize(None).to_pydatetime(),
+            max_value=window_end.tz_localize(None).to_pydatetime(),
+            value=(window_start.tz_localize(None).to_pydatetime(), window_end.tz_localize(None).to_pydatetime()),
+            step=step,
+            format="YYYY-MM-DD HH:mm",
+            help=f"Times in UTC{first.strftime('%z')}"
+        )
+        window = [pd.Timestamp(value).tz_localize(first.tz) for value in time_window]
+        status_classes = st.multiselect(
+            "Status Classes", STATUS_CLASSES, placeholder="All status classes",
+            format_func=lambda name: name.replace('_', ' ').title()
+        )
+        methods = st.multiselect("Methods", list(aggregates.method_counts.index), placeholder="All methods")
+        traffic = st.radio("Traffic", ["All", "Humans", "Bots"], horizontal=True)
+        url_prefix = st.text_input("URL Prefix", placeholder="/api/")
+    
+    filters = LogFilter(
+        start_ns=window[0].value if window[0] > window_start else None,
+        end_ns=window[1].value if window[1] < window_end else None,
+        status_classes=tuple(status_classes),
+        methods=tuple(methods),
+        is_bot=None if traffic == "All" else traffic == "Bots",
+        bot_patterns=bot_patterns if traffic != "All" else (),
+        url_prefix=url_prefix,
+    )
+    if log_index is not None:
+        # Re-slicing the sorted rows is cheap, and only the summaries are cached per filter
+        with metrics.stage("filter: select") as run:
+            df = log_index.select(filters, bot_classifier)
+            run.rows = len(df)
+        if filters.active:
+            aggregates = load_aggregates((dataset_key, filters), df, exact_counts=not use_sketches)
+    elif filters.active:
+        aggregates = load_aggregates((dataset_key, filters), log_store, filters)
+
+# Proceed only if data is loaded (in memory, or in the log store) and matches the filters
+if aggregates is not None and aggregates.total_requests:
+    if filters.active:
+        st.info(f"Filters match {aggregates.total_requests:,} log entries")
+    
+    # Sketches replace the exact distinct counts and top lists in approximate mode
+    sketches = None
+    if use_sketches and log_tail is not None and not filters.active:
+        sketches = log_tail.load_sketches()
+    elif use_sketches:
+        sketches = load_sketches((dataset_key, filters), df if df is not None else log_store, filters)
+
     # Overview metrics
     st.header("📈 Overview")
     
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        st.metric("Total Requests", f"{len(df):,}")
+        st.metric("Total Requests", f"{aggregates.total_requests:,}")
     with col2:
-        st.metric("Unique IPs", f"{df['ip'].nunique():,}")
+        if sketches is not None:
+            st.metric(
+                "Unique IPs", f"≈{sketches.unique_ips:,}",
+                help=f"HyperLogLog estimate, standard error ±{sketches.ips.relative_error:.1%}"
+            )
+        else:
+            st.metric("Unique IPs", f"{aggregates.unique_ips:,}")
     with col3:
-        success_rate = (df['status'] < 400).mean() * 100
+        success_rate = aggregates.success_rate
         st.metric("Success Rate", f"{success_rate:.1f}%")
     with col4:
         st.metric("Error Rate", f"{100 - success_rate:.1f}%")
     
     # Raw data preview with show/hide toggle
     with st.expander("👁️ Preview Raw Data"):
-        st.dataframe(df.head(10))
+        # IPs are stored packed as uint32, so show them dotted
+        preview = df.head(10) if df is not None else log_store.head(10, filters)
+        st.dataframe(preview.assign(ip=format_ipv4(preview['ip'])))
+    
+    # Charts are cached per dataset, filters and approximate mode (plus their own parameters)
+    chart_key = (dataset_key, filters, use_sketches)
     
-    # Create tabs for different visualizations
-    tab1, tab2, tab3, tab4 = st.tabs(["Top URLs", "Top IPs", "HTTP Status Codes", "Requests Over Time"])
+    # Only the selected view is computed and rendered, unlike tabs which run all of them
+    view = st.radio(
+        "View", ["Top URLs", "Top IPs", "HTTP Status Codes", "Requests Over Time"],
+        horizontal=True, label_visibility="collapsed"
+    )
     
-    with tab1:
+    if view == "Top URLs":
         st.subheader("Top URLs Accessed")
         # Number selector for top N URLs
         top_n_urls = st.slider("Select number of top URLs to display", 5, 20, 10, key="urls_slider")
         
         # Calculate top URLs
-        top_urls = df['url'].value_counts().head(top_n_urls)
-        
-        # Create figure
-        fig, ax = plt.subplots(figsize=(10, 6))
-        top_urls.plot(kind='barh', ax=ax, color='skyblue')
-        ax.set_title(f'Top {top_n_urls} URLs Accessed')
-        ax.set_xlabel('Number of Requests')
-        ax.set_ylabel('URL')
-        ax.invert_yaxis()  # To have the highest count at the top
-        plt.tight_layout()
+        with metrics.stage("view: Top URLs"):
+            top_urls = sketches.top_urls.top(top_n_urls) if sketches is not None else aggregates.top_urls(top_n_urls)
         
         # Display the plot
-        st.pyplot(fig)
+        show_chart('top_urls_chart', top_urls, chart_key + (top_n_urls,))
+        if sketches is not None:
+            with st.expander("Error Bounds (Space-Saving)"):
+                st.dataframe(sketches.top_urls.bounds(top_n_urls))
+                st.caption(
+                    f"Each true count lies between min_count and count. "
+                    f"URLs not listed occur at most {sketches.top_urls.floor:,} times."
+                )
         
         # Explanation
         st.markdown("""
@@ -175,25 +718,27 @@ if df is not None and not df.empty:
         A high number of requests to specific URLs may indicate areas where caching could be improved.
         """)
     
-    with tab2:
+    elif view == "Top IPs":
         st.subheader("Top IP Addresses")
         # Number selector for top N IPs
         top_n_ips = st.slider("Select number of top IPs to display", 5, 20, 10, key="ips_slider")
         
         # Calculate top IPs
-        top_ips = df['ip'].value_counts().head(top_n_ips)
-        
-        # Create figure
-        fig, ax = plt.subplots(figsize=(10, 6))
-        top_ips.plot(kind='barh', ax=ax, color='green')
-        ax.set_title(f'Top {top_n_ips} IP Addresses by Number of Requests')
-        ax.set_xlabel('Number of Requests')
-        ax.set_ylabel('IP Address')
-        ax.invert_yaxis()  # To have the highest count at the top
-        plt.tight_layout()
+        with metrics.stage("view: Top IPs"):
+            top_ips = sketches.top_ips.top(top_n_ips) if sketches is not None else aggregates.top_ips(top_n_ips)
+            top_ips.index = format_ipv4(top_ips.index)
         
         # Display the plot
-        st.pyplot(fig)
+        show_chart('top_ips_chart', top_ips, chart_key + (top_n_ips,))
+        if sketches is not None:
+            with st.expander("Error Bounds (Space-Saving)"):
+                ip_bounds = sketches.top_ips.bounds(top_n_ips)
+                ip_bounds.index = format_ipv4(ip_bounds.index)
+                st.dataframe(ip_bounds)
+                st.caption(
+                    f"Each true count lies between min_count and count. "
+                    f"IPs not listed occur at most {sketches.top_ips.floor:,} times."
+                )
         
         # Explanation
         st.markdown("""
@@ -206,55 +751,26 @@ if df is not None and not df.empty:
         IPs starting with 66.249.66.x are typically Google crawlers, while those starting with 207.46.13.x and 40.77.x.x often belong to Microsoft/Bing crawlers.
         """)
     
-    with tab3:
+    elif view == "HTTP Status Codes":
         st.subheader("HTTP Status Code Distribution")
         
-        # Calculate status code distribution
-        status_counts = df['status'].value_counts().sort_index()
-        
-        # Create status code groups for coloring
-        def status_color(code):
-            if 200 <= code < 300:
-                return 'success'
-            elif 300 <= code < 400:
-                return 'redirect'
-            elif 400 <= code < 500:
-                return 'client_error'
-            else:
-                return 'server_error'
-        
-        df['status_type'] = df['status'].apply(status_color)
-        status_type_counts = df['status_type'].value_counts()
+        with metrics.stage("view: HTTP Status Codes"):
+            # Calculate status code distribution
+            status_counts = aggregates.status_counts
+            
+            # Status code groups for coloring, from integer binning of the codes
+            status_type_counts = aggregates.status_class_counts()
         
         # Create two columns for different views
         col1, col2 = st.columns(2)
         
         with col1:
             # Status code detailed view
-            fig1, ax1 = plt.subplots(figsize=(8, 5))
-            status_counts.plot(kind='bar', ax=ax1, color='orange')
-            ax1.set_title('HTTP Status Code Distribution')
-            ax1.set_xlabel('Status Code')
-            ax1.set_ylabel('Count')
-            ax1.tick_params(axis='x', rotation=0)
-            plt.tight_layout()
-            st.pyplot(fig1)
+            show_chart('status_codes_chart', status_counts, chart_key)
         
         with col2:
             # Status type view (grouped)
-            fig2, ax2 = plt.subplots(figsize=(8, 5))
-            colors = {'success': 'green', 'redirect': 'blue', 'client_error': 'orange', 'server_error': 'red'}
-            status_type_counts.plot(
-                kind='pie', 
-                ax=ax2,
-                autopct='%1.1f%%',
-                colors=[colors[s] for s in status_type_counts.index],
-                explode=[0.05 if s != 'success' else 0 for s in status_type_counts.index]
-            )
-            ax2.set_title('HTTP Status Code Types')
-            ax2.set_ylabel('')
-            plt.tight_layout()
-            st.pyplot(fig2)
+            show_chart('status_classes_chart', status_type_counts, chart_key)
         
         # Add a legend explaining status codes
         st.markdown("""
@@ -276,28 +792,19 @@ if df is not None and not df.empty:
           - 504: Gateway Timeout - Server acting as gateway did not receive response in time
         """)
     
-    with tab4:
+    elif view == "Requests Over Time":
         st.subheader("Requests Over Time")
         
         # Group by hour and count requests
-        requests_per_hour = df.groupby('hour').size()
-        
-        # Create time plot
-        fig, ax = plt.subplots(figsize=(12, 6))
-        requests_per_hour.plot(kind='line', marker='o', color='purple', ax=ax)
-        ax.set_title('Number of Requests Over Time')
-        ax.set_xlabel('Time')
-        ax.set_ylabel('Number of Requests')
-        ax.grid(True, alpha=0.3)
-        plt.xticks(rotation=45)
-        plt.tight_layout()
+        requests_per_hour = aggregates.hourly_counts
         
         # Display the plot
-        st.pyplot(fig)
+        show_chart('requests_over_time_chart', requests_per_hour, chart_key)
         
         # Calculate peak hours
-        peak_hour = requests_per_hour.idxmax()
-        peak_requests = requests_per_hour.max()
+        with metrics.stage("view: Requests Over Time"):
+            peak_hour = requests_per_hour.idxmax()
+            peak_requests = requests_per_hour.max()
         
         # Display peak information
         st.info(f"**Peak Traffic Hour:** {peak_hour.strftime('%Y-%m-%d %H:%M')} with {peak_requests:,} requests")
@@ -321,31 +828,15 @@ if df is not None and not df.empty:
     # Additional analysis section
     st.header("🔍 Additional Analysis")
     
-    # User agent analysis (Browser vs Bot)
-    def is_bot(user_agent):
-        bot_patterns = ['bot', 'crawl', 'spider', 'slurp', 'bingbot', 'googlebot']
-        return any(pattern in user_agent.lower() for pattern in bot_patterns)
-    
-    df['is_bot'] = df['user_agent'].apply(is_bot)
-    bot_counts = df['is_bot'].value_counts()
+    # User agent analysis (Browser vs Bot), classified once per distinct user agent
+    with metrics.stage("view: Bot vs Human Traffic"):
+        bot_counts = aggregates.bot_counts(bot_classifier)
     
     col1, col2 = st.columns(2)
     
     with col1:
         st.subheader("Bot vs Human Traffic")
-        fig, ax = plt.subplots(figsize=(8, 8))
-        bot_counts.plot(
-            kind='pie',
-            labels=['Human', 'Bot'] if False in bot_counts.index else ['Bot'],
-            autopct='%1.1f%%',
-            colors=['lightblue', 'lightgreen'],
-            explode=[0, 0.1] if False in bot_counts.index else [0],
-            ax=ax
-        )
-        ax.set_title('Bot vs Human Traffic')
-        ax.set_ylabel('')
-        plt.tight_layout()
-        st.pyplot(fig)
+        show_chart('bot_traffic_chart', bot_counts, chart_key + (bot_patterns,))
         
         # Bot explanation
         st.markdown("""
@@ -361,19 +852,9 @@ if df is not None and not df.empty:
     
     with col2:
         st.subheader("Request Methods")
-        method_counts = df['method'].value_counts()
+        method_counts = aggregates.method_counts
         
-        fig, ax = plt.subplots(figsize=(8, 8))
-        method_counts.plot(
-            kind='pie',
-            autopct='%1.1f%%',
-            colors=sns.color_palette('pastel'),
-            ax=ax
-        )
-        ax.set_title('HTTP Request Methods')
-        ax.set_ylabel('')
-        plt.tight_layout()
-        st.pyplot(fig)
+        show_chart('request_methods_chart', method_counts, chart_key)
         
         # Method explanation
         st.markdown("""
@@ -387,22 +868,70 @@ if df is not None and not df.empty:
         A high proportion of GET requests is typical for content websites, while APIs tend to have more variety in request methods.
         """)
     
+    # Response size percentiles, estimated with a t-digest in approximate mode
+    st.subheader("Response Sizes")
+    if sketches is not None:
+        st.dataframe(sketches.size_percentiles(), hide_index=True)
+        st.caption(
+            "t-digest estimates. rank_error is the share of requests whose sizes are only known by their mean, "
+            "and min_size/max_size are the sizes at the percentile ± rank_error."
+        )
+    elif df is not None:
+        with metrics.stage("view: Response Sizes"):
+            size_percentiles = aggregates.size_percentiles(SIZE_PERCENTILES)
+        st.dataframe(size_percentiles, hide_index=True)
+    else:
+        st.caption("Turn on approximate analytics to estimate response size percentiles of the log store.")
+    
     # Download processed data section
     st.header("💾 Export Data")
     
-    # Function to convert dataframe to CSV for download
-    def get_csv_download_link(df, filename="web_log_data.csv"):
-        csv = df.to_csv(index=False)
-        b64 = base64.b64encode(csv.encode()).decode()
-        href = f'<a href="data:file/csv;base64,{b64}" download="{filename}">Download CSV File</a>'
-        return href
+    # Exports are written to a temporary file in chunks, only when asked for
+    export_formats = [name for name in EXPORT_FORMATS if name != "Parquet" or HAS_PYARROW]
+    export_format = st.selectbox("Export Format", export_formats)
+    # The is_bot column depends on the bot patterns even when the traffic filter does not use them
+    export_key = (dataset_key, filters, bot_patterns, export_format)
+    prepared = st.session_state.get("export_file")
+    if prepared and prepared[0] != export_key:
+        # The data, filters or format changed since, so the prepared file is deleted
+        remove_export(prepared[1])
+        prepared = st.session_state["export_file"] = None
     
-    st.markdown(get_csv_download_link(df), unsafe_allow_html=True)
+    if st.button("Prepare Export"):
+        with st.spinner("Writing export file..."):
+            if df is not None:
+                with metrics.stage("derive: status_type, is_bot", len(df)):
+                    export_source = derive_export_columns(df, bot_classifier)
+            else:
+                # The store is exported chunk by chunk, so each chunk gets its derived columns as it is written
+                export_source = (
+                    derive_export_columns(frame, bot_classifier)
+                    for frame in log_store.iter_frames(EXPORT_CHUNK_ROWS, filters)
+                )
+            with metrics.stage(f"export: {export_format}", aggregates.total_requests):
+                export_path = export_to_file(export_source, export_format)
+        # Only the latest export is kept on disk
+        if prepared:
+            remove_export(prepared[1])
+        prepared = st.session_state["export_file"] = (export_key, export_path)
+    
+    if prepared and os.path.exists(prepared[1]):
+        extension, mime = EXPORT_FORMATS[export_format]
+        with open(prepared[1], 'rb') as export_file:
+            st.download_button(
+                f"Download {export_format} File",
+                data=export_file,
+                file_name=f"web_log_data.{extension}",
+                mime=mime
+            )
     
     # Footer with report generation time
     st.markdown("---")
     st.markdown(f"*Report generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}*")
 
+elif filters.active:
+    st.warning("No log entries match the filters. Widen them in the sidebar.")
+
 else:
     # Show instructions if no data is loaded
     st.info("Please upload an access log file using the sidebar or use the example data to start.")
@@ -425,3 +954,38 @@ else:
     - Referrer URL
     - User agent string
     """)
+
+# Stage timings, memory and hit/miss counts of this session's reruns so far
+if st.sidebar.checkbox("Show Performance Panel", value=False):
+    with st.sidebar.expander("Performance", expanded=True):
+        if st.button("Reset Metrics"):
+            metrics.reset()
+        st.dataframe(
+            metrics.frame(), hide_index=True,
+            column_config={
+                'last_seconds': st.column_config.NumberColumn("last (s)", format="%.4f"),
+                'total_seconds': st.column_config.NumberColumn("total (s)", format="%.4f"),
+                'rows_per_second': st.column_config.NumberColumn("rows/s (last)", format="%.0f"),
+                'peak_rss_delta_mb': st.column_config.NumberColumn("peak RSS Δ (MB)", format="%.1f"),
+            }
+        )
+        st.dataframe(
+            pd.DataFrame({'counter': list(metrics.counters), 'value': list(metrics.counters.values())}),
+            hide_index=True
+        )
+        st.caption(
+            "rejected_lines did not match the log format; the other unparsed lines had an invalid timestamp "
+            "or address. Peak RSS Δ is the largest memory growth of the process during a stage."
+        )
+        st.download_button(
+            "Download JSON", data=metrics.to_json(), file_name="pipeline_metrics.json", mime="application/json"
+        )
+        st.download_button(
+            "Download Prometheus Text", data=metrics.to_prometheus(), file_name="pipeline_metrics.prom",
+            mime="text/plain"
+        )
+
+# Live tail auto-refresh: wait, then rerun to pick up newly appended lines
+if follow_file and refresh_interval:
+    time.sleep(refresh_interval)
+    st.rerun()
@@ -0,0 +1,184 @@
+"""Synthetic combined-format access logs for benchmarks.
+
+Lines are generated in vectorized blocks, so even 10M-line logs only need
+memory for one block at a time:
+
+    python benchmarks/generate_logs.py 1000000 -o access.log
+    python benchmarks/generate_logs.py 100000 -o access.log.gz --bot-share 0.4 --timezones +0000,-0500,+0530
+
+URLs and client IPs follow Zipf distributions, a share of the requests comes
+from bot user agents, status codes follow a typical mix, timestamps advance
+with jitter in one or more UTC offsets, and a share of lines is malformed.
+"""
+import argparse
+import gzip
+import sys
+
+import numpy as np
+
+BLOCK_LINES = 100_000
+MONTH_NAMES = np.array(['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'])
+
+# Status code mix: code -> share of requests
+STATUS_MIX = {200: 0.74, 304: 0.07, 301: 0.02, 302: 0.03, 404: 0.08, 403: 0.02, 499: 0.01, 500: 0.02, 502: 0.01}
+METHOD_MIX = {'GET': 0.86, 'POST': 0.09, 'HEAD': 0.03, 'PUT': 0.01, 'DELETE': 0.01}
+HUMAN_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.0 Safari/605.1.15",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 Mobile/15E148",
+    "Mozilla/5.0 (Linux; Android 14; Pixel 8) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Mobile Safari/537.36",
+    "Mozilla/5.0 (X11; Linux x86_64; rv:121.0) Gecko/20100101 Firefox/121.0",
+]
+BOT_AGENTS = [
+    "Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)",
+    "Mozilla/5.0 (compatible; bingbot/2.0; +http://www.bing.com/bingbot.htm)",
+    "Mozilla/5.0 (compatible; YandexBot/3.0; +http://yandex.com/bots)",
+    "Mozilla/5.0 (compatible; AhrefsBot/7.0; +http://ahrefs.com/robot/)",
+    "Baiduspider+(+http://www.baidu.com/search/spider.htm)",
+]
+REFERRERS = ["-", "https://example.com/", "https://example.com/search", "https://www.google.com/", "https://t.co/x"]
+MALFORMED_LINES = [
+    "GET /incomplete",
+    "\x00\x00\x00",
+    '10.0.0.1 - - [not a timestamp] "GET / HTTP/1.1" 200 1 "-" "-"',
+    '10.0.0.1 - - [01/Jan/2024:00:00:00 +0000] "GARBAGE" 200',
+]
+
+
+# Function to draw Zipf-distributed ranks in [0, n) (rank 0 is the most frequent)
+def zipf_ranks(rng, n, exponent, size):
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return rng.choice(n, size=size, p=weights / weights.sum())
+
+
+# Function to parse offsets like "+0000,-0500" into minutes
+def parse_offsets(text):
+    offsets = []
+    for value in text.split(','):
+        value = value.strip()
+        sign = -1 if value.startswith('-') else 1
+        digits = value.lstrip('+-')
+        offsets.append(sign * (int(digits[:2]) * 60 + int(digits[2:4])))
+    return offsets
+
+
+# Function to format epoch seconds as access-log timestamps in the given UTC offsets
+def format_timestamps(epoch_seconds, offsets):
+    local = (epoch_seconds + offsets.astype(np.int64) * 60).astype('datetime64[s]')
+    days = local.astype('datetime64[D]')
+    months = days.astype('datetime64[M]')
+    years = months.astype('datetime64[Y]')
+    day = (days - months).astype(np.int64) + 1
+    month = MONTH_NAMES[(months - years).astype(np.int64)]
+    year = years.astype(np.int64) + 1970
+    seconds = (local - days).astype(np.int64)
+    signs = np.where(offsets < 0, '-', '+')
+    minutes = np.abs(offsets)
+    return [
+        f"{d:02d}/{m}/{y}:{s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d} {sign}{o // 60:02d}{o % 60:02d}"
+        for d, m, y, s, sign, o in zip(day.tolist(), month.tolist(), year.tolist(), seconds.tolist(),
+                                       signs.tolist(), minutes.tolist())
+    ]
+
+
+# Function to yield blocks of synthetic log lines
+def generate_lines(lines, seed=0, distinct_urls=50_000, distinct_ips=100_000, zipf_exponent=1.1,
+                   bot_share=0.3, malformed_share=0.001, offsets=(0,), start='2024-01-01T00:00:00',
+                   requests_per_second=50.0, block_lines=BLOCK_LINES):
+    rng = np.random.default_rng(seed)
+    urls = np.array([f"/p/{rank + 1}" for rank in range(distinct_urls)], dtype=object)
+    ips = rng.integers(1 << 24, 0xDFFFFFFF, size=distinct_ips, dtype=np.int64)
+    ip_strings = np.array([f"{ip >> 24}.{ip >> 16 & 255}.{ip >> 8 & 255}.{ip & 255}" for ip in ips.tolist()],
+                          dtype=object)
+    statuses = np.array(list(STATUS_MIX))
+    status_weights = np.array(list(STATUS_MIX.values()))
+    methods = np.array(list(METHOD_MIX), dtype=object)
+    method_weights = np.array(list(METHOD_MIX.values()))
+    offsets = np.asarray(offsets, dtype=np.int64)
+    clock = np.datetime64(start, 's').astype(np.int64).astype(np.float64)
+
+    for block_start in range(0, lines, block_lines):
+        size = min(block_lines, lines - block_start)
+        # Timestamps advance with exponential gaps, with a little out-of-order jitter
+        gaps = rng.exponential(1.0 / requests_per_second, size=size)
+        seconds = clock + np.cumsum(gaps)
+        clock = seconds[-1]
+        seconds = (seconds + rng.normal(0, 0.5, size=size)).astype(np.int64)
+        timestamps = format_timestamps(seconds, offsets[rng.integers(0, len(offsets), size=size)])
+
+        is_bot = rng.random(size) < bot_share
+        agents = np.where(
+            is_bot,
+            np.array(BOT_AGENTS, dtype=object)[rng.integers(0, len(BOT_AGENTS), size=size)],
+            np.array(HUMAN_AGENTS, dtype=object)[rng.integers(0, len(HUMAN_AGENTS), size=size)],
+        )
+        block = zip(
+            ip_strings[zipf_ranks(rng, distinct_ips, zipf_exponent, size)].tolist(),
+            timestamps,
+            methods[rng.choice(len(methods), size=size, p=method_weights)].tolist(),
+            urls[zipf_ranks(rng, distinct_urls, zipf_exponent, size)].tolist(),
+            statuses[rng.choice(len(statuses), size=size, p=status_weights)].tolist(),
+            np.where(rng.random(size) < 0.05, -1, rng.lognormal(8, 1.5, size=size).astype(np.int64)).tolist(),
+            np.array(REFERRERS, dtype=object)[rng.integers(0, len(REFERRERS), size=size)].tolist(),
+            agents.tolist(),
+        )
+        block_lines_text = [
+            f'{ip} - - [{timestamp}] "{method} {url} HTTP/1.1" {status} {"-" if body < 0 else body} '
+            f'"{referrer}" "{agent}"'
+            for ip, timestamp, method, url, status, body, referrer, agent in block
+        ]
+        # Replace a share of the lines with malformed ones
+        for index in np.flatnonzero(rng.random(size) < malformed_share).tolist():
+            block_lines_text[index] = MALFORMED_LINES[index % len(MALFORMED_LINES)]
+        yield block_lines_text
+
+
+# Function to write a synthetic log file (gzip-compressed if the path ends in .gz)
+def write_log(path, lines, **options):
+    opener = gzip.open if str(path).endswith('.gz') else open
+    with opener(path, 'wt', encoding='utf-8', newline='\n') as handle:
+        for block in generate_lines(lines, **options):
+            handle.write('\n'.join(block))
+            handle.write('\n')
+    return path
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic combined-format access log.")
+    parser.add_argument('lines', type=int, help="number of lines to write")
+    parser.add_argument('-o', '--output', default='-', help="output path ('.gz' compresses); '-' writes to stdout")
+    parser.add_argument('--seed', type=int, default=0, help="random seed (default: 0)")
+    parser.add_argument('--urls', type=int, default=50_000, help="distinct URLs (default: 50000)")
+    parser.add_argument('--ips', type=int, default=100_000, help="distinct client IPs (default: 100000)")
+    parser.add_argument('--zipf', type=float, default=1.1, help="Zipf exponent of URLs and IPs (default: 1.1)")
+    parser.add_argument('--bot-share', type=float, default=0.3, help="share of bot requests (default: 0.3)")
+    parser.add_argument('--malformed-share', type=float, default=0.001,
+                        help="share of malformed lines (default: 0.001)")
+    parser.add_argument('--timezones', default='+0000', help="comma-separated UTC offsets (default: +0000)")
+    parser.add_argument('--start', default='2024-01-01T00:00:00', help="first timestamp, UTC")
+    parser.add_argument('--rate', type=float, default=50.0, help="average requests per second (default: 50)")
+    return parser.parse_args(argv)
+
+
+# Function to map the command line options to generate_lines() keyword arguments
+def generator_options(args):
+    return dict(
+        seed=args.seed, distinct_urls=args.urls, distinct_ips=args.ips, zipf_exponent=args.zipf,
+        bot_share=args.bot_share, malformed_share=args.malformed_share, offsets=parse_offsets(args.timezones),
+        start=args.start, requests_per_second=args.rate,
+    )
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.output == '-':
+        for block in generate_lines(args.lines, **generator_options(args)):
+            sys.stdout.write('\n'.join(block))
+            sys.stdout.write('\n')
+    else:
+        write_log(args.output, args.lines, **generator_options(args))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,292 @@
+"""Benchmarks of the parse, aggregate and export pipeline.
+
+Generates synthetic logs (cached in --data-dir), then times and measures the
+peak memory of each stage at each size, and writes the results as JSON:
+
+    python benchmarks/run_benchmarks.py                        # 10K, 1M and 10M lines
+    python benchmarks/run_benchmarks.py --sizes 10000 1000000 -o results.json
+    python benchmarks/run_benchmarks.py --compare baseline.json --threshold 0.2
+
+With --compare, stages that got slower or use more memory than the baseline by
+more than the threshold are listed and the exit status is 1.
+
+Every stage first runs once on a small log without being recorded, so that
+one-time costs (imports, compiled patterns, thread pools) are not counted
+against whichever stage happens to run first. Memory is compared by the peak
+allocation traced by tracemalloc in one extra run of each stage: the resident
+set size is still recorded, but it depends on how much freed memory earlier
+stages left to the allocator, so it is too noisy to compare.
+"""
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# The app's modules live in the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cli import ENGINES  # noqa: E402
+from generate_logs import write_log  # noqa: E402
+from log_analysis import BotClassifier, build_aggregates, classify_status, count_values  # noqa: E402
+from log_export import write_csv, write_parquet  # noqa: E402
+from log_index import LogFilter, LogIndex  # noqa: E402
+from log_parser import CHUNK_SIZE, decode_timestamps, parse_logs, timestamp_columns  # noqa: E402
+from log_sketch import build_sketches, iter_chunks  # noqa: E402
+from pipeline_metrics import RssSampler  # noqa: E402
+
+DEFAULT_SIZES = [10_000, 1_000_000, 10_000_000]
+DEFAULT_DATA_DIR = Path(__file__).resolve().parent / 'data'
+WARMUP_LINES = 10_000
+TIMESTAMP_FORMAT = '%d/%b/%Y:%H:%M:%S %z'
+# Differences below these are treated as noise when comparing with a baseline
+MIN_SECONDS = 0.01
+MIN_ALLOCATED_MB = 1.0
+
+
+# Function to run a stage under tracemalloc, returning the peak of the memory it allocated in bytes
+def traced_peak(function, *args):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        function(*args)
+        return tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+
+
+# Function to run one stage, returning its result and a result record. The timed
+# runs are not traced, since tracemalloc slows down every allocation.
+def measure(stage, lines, rows, function, *args, repeat=1):
+    best_seconds, peak_delta, result = None, None, None
+    for _ in range(repeat):
+        result = None
+        gc.collect()
+        with RssSampler() as sampler:
+            started = time.perf_counter()
+            result = function(*args)
+            seconds = time.perf_counter() - started
+        best_seconds = seconds if best_seconds is None else min(best_seconds, seconds)
+        if sampler.peak_delta is not None:
+            peak_delta = sampler.peak_delta if peak_delta is None else min(peak_delta, sampler.peak_delta)
+    peak_allocated = traced_peak(function, *args)
+    record = {
+        'stage': stage,
+        'lines': lines,
+        'rows': rows,
+        'seconds': round(best_seconds, 6),
+        'rows_per_second': round(rows / best_seconds) if best_seconds else None,
+        'peak_allocated_mb': round(peak_allocated / 2**20, 2),
+        'peak_rss_delta_mb': None if peak_delta is None else round(peak_delta / 2**20, 2),
+    }
+    print(f"{lines:>12,} {stage:<32} {best_seconds:>10.3f}s "
+          f"{record['rows_per_second'] or 0:>14,} rows/s "
+          f"{record['peak_allocated_mb']:>10,.1f} MB allocated "
+          f"{'-' if peak_delta is None else format(record['peak_rss_delta_mb'], ',.1f'):>10} MB RSS",
+          file=sys.stderr, flush=True)
+    return result, record
+
+
+# Function to return a cached synthetic log of the given size, generating it if needed
+def synthetic_log(data_dir, lines, seed):
+    path = Path(data_dir) / f'access_{lines}_{seed}.log'
+    if not path.exists():
+        print(f"Generating {path} ...", file=sys.stderr, flush=True)
+        Path(data_dir).mkdir(parents=True, exist_ok=True)
+        partial = path.with_suffix('.log.partial')
+        write_log(partial, lines, seed=seed, offsets=(0, -300, 330))
+        partial.replace(path)
+    return path
+
+
+# Function to rebuild the raw timestamp strings of a parsed log (formatted once per distinct second)
+def raw_timestamps(df):
+    codes, uniques = pd.factorize(df['datetime'])
+    return np.asarray(uniques.strftime(TIMESTAMP_FORMAT), dtype=object)[codes]
+
+
+# Function to decode raw timestamps the way the parser does
+def decode_datetimes(values):
+    epoch, offsets, _ = decode_timestamps(values)
+    return timestamp_columns(epoch, offsets)
+
+
+# Function to convert raw timestamps with pandas, for reference
+def to_datetime(values):
+    return pd.to_datetime(pd.Series(values), format=TIMESTAMP_FORMAT)
+
+
+# Function to count user agents and classify the distinct ones, as the bot traffic chart does
+def bot_traffic(df):
+    counts = count_values(df['user_agent'])
+    is_bot = BotClassifier().classify_values(counts.index)
+    return counts.groupby(is_bot).sum()
+
+
+# Function to list the computations behind each dashboard view (the parts of
+# build_aggregates each view reads), plus the derived columns and all aggregates
+def view_stages(df):
+    return {
+        'aggregate[top_urls]': lambda: count_values(df['url']).head(10),
+        'aggregate[top_ips]': lambda: count_values(df['ip']).head(10),
+        'aggregate[status_codes]': lambda: np.bincount(df['status'].to_numpy()),
+        'aggregate[requests_over_time]': lambda: df['hour'].value_counts(sort=False).sort_index(),
+        'aggregate[bot_traffic]': lambda: bot_traffic(df),
+        'aggregate[methods]': lambda: count_values(df['method']),
+        'aggregate[all]': lambda: build_aggregates(df),
+        'derived[status_type,is_bot]': lambda: (classify_status(df['status']),
+                                                BotClassifier().classify(df['user_agent'])),
+    }
+
+
+# Function to run all stages for one log size
+def run_size(lines, args, scratch):
+    path = synthetic_log(args.data_dir, lines, args.seed)
+    records = []
+
+    df = None
+    for engine in args.engines:
+        parsed, record = measure(f'parse[{engine}]', lines, lines, parse_logs, path, CHUNK_SIZE, ENGINES[engine],
+                                 repeat=args.repeat)
+        records.append(record)
+        df = parsed if df is None else df
+        del parsed
+    rows = len(df)
+
+    values = raw_timestamps(df)
+    for stage, function in [('datetime[decode_timestamps]', decode_datetimes), ('datetime[pd.to_datetime]', to_datetime)]:
+        _, record = measure(stage, lines, rows, function, values, repeat=args.repeat)
+        records.append(record)
+    del values
+
+    for stage, function in view_stages(df).items():
+        _, record = measure(stage, lines, rows, function, repeat=args.repeat)
+        records.append(record)
+
+    _, record = measure('sketches', lines, rows, lambda: build_sketches(iter_chunks(df)), repeat=args.repeat)
+    records.append(record)
+
+    index, record = measure('filter[build_index]', lines, rows, LogIndex, df, repeat=args.repeat)
+    records.append(record)
+    times = index.times
+    window = LogFilter(start_ns=int(times[len(times) // 4]), end_ns=int(times[3 * len(times) // 4]),
+                       status_classes=('success',), methods=('GET',), is_bot=False)
+    _, record = measure('filter[select]', lines, rows, index.select, window, BotClassifier(), repeat=args.repeat)
+    records.append(record)
+    del index
+
+    exports = [
+        ('export[csv]', lambda: write_csv(df, scratch / 'export.csv')),
+        ('export[csv_gzip]', lambda: write_csv(df, scratch / 'export.csv.gz', compress=True)),
+        ('export[parquet]', lambda: write_parquet(df, scratch / 'export.parquet')),
+    ]
+    for stage, function in exports:
+        _, record = measure(stage, lines, rows, function, repeat=args.repeat)
+        records.append(record)
+    for exported in scratch.iterdir():
+        exported.unlink()
+    return records
+
+
+# Function to describe the environment the benchmarks ran in
+def environment():
+    versions = {'python': platform.python_version()}
+    for name in ['numpy', 'pandas', 'pyarrow']:
+        try:
+            versions[name] = __import__(name).__version__
+        except ImportError:
+            versions[name] = None
+    return {
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'versions': versions,
+    }
+
+
+# Function to list the stages that regressed against a baseline
+def compare(results, baseline, threshold):
+    previous = {(record['lines'], record['stage']): record for record in baseline['results']}
+    regressions = []
+    for record in results['results']:
+        before = previous.get((record['lines'], record['stage']))
+        if before is None:
+            continue
+        checks = [('seconds', MIN_SECONDS), ('peak_allocated_mb', MIN_ALLOCATED_MB)]
+        for metric, noise in checks:
+            old, new = before.get(metric), record.get(metric)
+            if old is None or new is None:
+                continue
+            if new > old * (1 + threshold) and new - old > noise:
+                regressions.append({
+                    'stage': record['stage'], 'lines': record['lines'], 'metric': metric,
+                    'baseline': old, 'current': new, 'change': round(new / old - 1, 3) if old else None,
+                })
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark parsing, aggregation and export of access logs.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help="log sizes in lines (default: 10000 1000000 10000000)")
+    parser.add_argument('--engines', nargs='+', choices=list(ENGINES), default=list(ENGINES),
+                        help="parsing engines to benchmark (default: all)")
+    parser.add_argument('--repeat', type=int, default=1, help="runs per stage, keeping the best (default: 1)")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the synthetic logs (default: 0)")
+    parser.add_argument('--data-dir', type=Path, default=DEFAULT_DATA_DIR,
+                        help="directory caching the synthetic logs (default: benchmarks/data)")
+    parser.add_argument('-o', '--output', default='benchmark_results.json', help="results file ('-' for stdout)")
+    parser.add_argument('--compare', type=Path, help="baseline results file to compare against")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="allowed slowdown or memory growth against the baseline (default: 0.2 = 20%%)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = {'meta': environment(), 'results': []}
+    scratch = Path(tempfile.mkdtemp(prefix='log_benchmarks_'))
+    try:
+        print(f"Warming up on {WARMUP_LINES:,} lines ...", file=sys.stderr, flush=True)
+        with contextlib.redirect_stderr(io.StringIO()):
+            run_size(WARMUP_LINES, args, scratch)
+        for lines in args.sizes:
+            results['results'].extend(run_size(lines, args, scratch))
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    status = 0
+    if args.compare:
+        with open(args.compare) as handle:
+            regressions = compare(results, json.load(handle), args.threshold)
+        results['regressions'] = regressions
+        for regression in regressions:
+            print(f"REGRESSION {regression['stage']} at {regression['lines']:,} lines: {regression['metric']} "
+                  f"{regression['baseline']} -> {regression['current']}", file=sys.stderr)
+        status = 1 if regressions else 0
+
+    text = json.dumps(results, indent=2)
+    if args.output == '-':
+        print(text)
+    else:
+        with open(args.output, 'w') as handle:
+            handle.write(text + '\n')
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,108 @@
+"""Matplotlib figures for the dashboard and for headless reports.
+
+Each function takes one of the small aggregate tables and returns a figure,
+so callers that never render charts never need to import this module.
+"""
+import matplotlib.pyplot as plt
+
+STATUS_CLASS_COLORS = {'success': 'green', 'redirect': 'blue', 'client_error': 'orange', 'server_error': 'red'}
+
+
+# Horizontal bar chart of the most accessed URLs
+def top_urls_chart(top_urls):
+    fig, ax = plt.subplots(figsize=(10, 6))
+    top_urls.plot(kind='barh', ax=ax, color='skyblue')
+    ax.set_title(f'Top {len(top_urls)} URLs Accessed')
+    ax.set_xlabel('Number of Requests')
+    ax.set_ylabel('URL')
+    ax.invert_yaxis()  # To have the highest count at the top
+    fig.tight_layout()
+    return fig
+
+
+# Horizontal bar chart of the busiest client IPs (index already formatted as dotted strings)
+def top_ips_chart(top_ips):
+    fig, ax = plt.subplots(figsize=(10, 6))
+    top_ips.plot(kind='barh', ax=ax, color='green')
+    ax.set_title(f'Top {len(top_ips)} IP Addresses by Number of Requests')
+    ax.set_xlabel('Number of Requests')
+    ax.set_ylabel('IP Address')
+    ax.invert_yaxis()  # To have the highest count at the top
+    fig.tight_layout()
+    return fig
+
+
+# Bar chart of requests per status code
+def status_codes_chart(status_counts):
+    fig, ax = plt.subplots(figsize=(8, 5))
+    status_counts.plot(kind='bar', ax=ax, color='orange')
+    ax.set_title('HTTP Status Code Distribution')
+    ax.set_xlabel('Status Code')
+    ax.set_ylabel('Count')
+    ax.tick_params(axis='x', rotation=0)
+    fig.tight_layout()
+    return fig
+
+
+# Pie chart of requests per status class
+def status_classes_chart(status_class_counts):
+    fig, ax = plt.subplots(figsize=(8, 5))
+    status_class_counts.plot(
+        kind='pie',
+        ax=ax,
+        autopct='%1.1f%%',
+        colors=[STATUS_CLASS_COLORS[s] for s in status_class_counts.index],
+        explode=[0.05 if s != 'success' else 0 for s in status_class_counts.index]
+    )
+    ax.set_title('HTTP Status Code Types')
+    ax.set_ylabel('')
+    fig.tight_layout()
+    return fig
+
+
+# Line chart of requests per hour
+def requests_over_time_chart(requests_per_hour):
+    fig, ax = plt.subplots(figsize=(12, 6))
+    requests_per_hour.plot(kind='line', marker='o', color='purple', ax=ax)
+    ax.set_title('Number of Requests Over Time')
+    ax.set_xlabel('Time')
+    ax.set_ylabel('Number of Requests')
+    ax.grid(True, alpha=0.3)
+    ax.tick_params(axis='x', labelrotation=45)
+    fig.tight_layout()
+    return fig
+
+
+# Pie chart of bot versus human requests (index: is_bot flags)
+def bot_traffic_chart(bot_counts):
+    fig, ax = plt.subplots(figsize=(8, 8))
+    bot_counts.plot(
+        kind='pie',
+        labels=['Bot' if is_bot else 'Human' for is_bot in bot_counts.index],
+        autopct='%1.1f%%',
+        colors=['lightgreen' if is_bot else 'lightblue' for is_bot in bot_counts.index],
+        explode=[0.1 if is_bot else 0 for is_bot in bot_counts.index],
+        ax=ax
+    )
+    ax.set_title('Bot vs Human Traffic')
+    ax.set_ylabel('')
+    fig.tight_layout()
+    return fig
+
+
+# Pie chart of requests per HTTP method
+def request_methods_chart(method_counts):
+    # seaborn is only needed for its palette, so load it with the chart
+    import seaborn as sns
+
+    fig, ax = plt.subplots(figsize=(8, 8))
+    method_counts.plot(
+        kind='pie',
+        autopct='%1.1f%%',
+        colors=sns.color_palette('pastel'),
+        ax=ax
+    )
+    ax.set_title('HTTP Request Methods')
+    ax.set_ylabel('')
+    fig.tight_layout()
+    return fig
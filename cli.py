@@ -0,0 +1,235 @@
+"""Headless batch reports for web server access logs.
+
+Runs the same parsing and summaries as the Streamlit dashboard without
+starting a web server, e.g. from cron:
+
+    python cli.py /var/log/nginx/access.log /var/log/nginx/access.log.1.gz -o reports/
+    zcat access.log.*.gz | python cli.py - --format csv -o reports/
+    python cli.py access.log -o reports/ --metrics-file /var/lib/node_exporter/weblog.prom
+
+Plotting libraries are only imported when --charts is given.
+"""
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import reduce
+
+import pandas as pd
+
+from log_analysis import DEFAULT_BOT_PATTERNS, BotClassifier, build_aggregates, overview, summary_tables
+from log_parser import PARSE_ENGINES, parse_logs, parse_logs_parallel
+from log_sketch import build_sketches, iter_chunks, sketch_tables
+from pipeline_metrics import PipelineMetrics, write_prometheus
+
+ENGINES = dict(zip(['regex', 'vectorized'], PARSE_ENGINES))
+FORMATS = ['json', 'csv', 'parquet']
+
+
+# Function to parse and summarize one log (a path, or '-' for stdin), also
+# returning the timings of its stages (the same stages as the dashboard's)
+def analyze_log(source, engine='regex', workers=1, approximate=False):
+    metrics = PipelineMetrics()
+    with metrics.stage("load: decode and parse") as run:
+        if source == '-':
+            df = parse_logs(sys.stdin.buffer, engine=ENGINES[engine])
+        elif workers > 1:
+            df = parse_logs_parallel(source, workers, engine=ENGINES[engine])
+        else:
+            with open(source, 'rb') as stream:
+                df = parse_logs(stream, engine=ENGINES[engine])
+        run.rows = len(df) + df.attrs['unparsed_lines']
+    metrics.count("parsed_lines", len(df))
+    metrics.count("unparsed_lines", df.attrs['unparsed_lines'])
+    metrics.count("rejected_lines", df.attrs['rejected_lines'])
+    aggregates = sketches = None
+    if not df.empty:
+        with metrics.stage("aggregate: summaries", len(df)):
+            aggregates = build_aggregates(df)
+        if approximate:
+            # Sketches are mergeable, so per-file sketches also give the combined report
+            with metrics.stage("aggregate: sketches", len(df)):
+                sketches = build_sketches(iter_chunks(df))
+    return aggregates, df.attrs['unparsed_lines'], sketches, metrics
+
+
+# Function to derive a report name from a log source
+def report_name(source):
+    return 'stdin' if source == '-' else os.path.basename(os.path.normpath(source))
+
+
+# Function to derive one distinct report name per log source. A name shared by
+# several logs (or taken by another report, like the combined one) is prefixed with
+# the log's parent directory, and with its position if that is still ambiguous.
+def report_names(sources, reserved=()):
+    def ambiguous(names):
+        return [names.count(name) > 1 or name in reserved for name in names]
+
+    names = [report_name(source) for source in sources]
+    names = [
+        f"{os.path.basename(os.path.dirname(os.path.abspath(source)))}_{name}" if clash and source != '-' else name
+        for source, name, clash in zip(sources, names, ambiguous(names))
+    ]
+    return [f"{position}_{name}" if clash else name
+            for position, (name, clash) in enumerate(zip(names, ambiguous(names)), 1)]
+
+
+# Function to assemble the JSON-serializable report of one log
+def build_report(name, aggregates, unparsed_lines, top_n, classifier, sketches=None):
+    report = {'source': name, 'unparsed_lines': int(unparsed_lines)}
+    if aggregates is None:
+        report.update(overview=None, tables={})
+        return report
+    tables = summary_tables(aggregates, top_n, classifier)
+    report['overview'] = overview(aggregates)
+    if sketches is not None:
+        tables.update(sketch_tables(sketches, top_n))
+        report['overview'].update(
+            approx_unique_ips=sketches.unique_ips,
+            approx_unique_ips_relative_error=round(sketches.ips.relative_error, 4),
+        )
+    report['tables'] = {
+        table_name: json.loads(table.to_json(orient='records', date_format='iso'))
+        for table_name, table in tables.items()
+    }
+    return report
+
+
+# Function to write one report's tables as CSV or Parquet files in a directory
+def write_tables(directory, aggregates, report, output_format, top_n, classifier, sketches=None):
+    os.makedirs(directory, exist_ok=True)
+    tables = summary_tables(aggregates, top_n, classifier) if aggregates is not None else {}
+    if sketches is not None:
+        tables.update(sketch_tables(sketches, top_n))
+    tables['overview'] = pd.DataFrame([{'unparsed_lines': report['unparsed_lines'], **(report['overview'] or {})}])
+    for table_name, table in tables.items():
+        path = os.path.join(directory, f"{table_name}.{output_format}")
+        if output_format == 'csv':
+            table.to_csv(path, index=False)
+        else:
+            table.to_parquet(path, index=False)
+
+
+# Function to render the dashboard charts of one log as PNG files
+def write_charts(directory, aggregates, top_n, classifier):
+    # Plotting libraries are heavy to import, so they are only loaded here
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    import charts
+
+    tables = summary_tables(aggregates, top_n, classifier)
+    figures = {
+        'top_urls': charts.top_urls_chart(aggregates.top_urls(top_n)),
+        'top_ips': charts.top_ips_chart(tables['top_ips'].set_index('ip')['count']),
+        'status_codes': charts.status_codes_chart(aggregates.status_counts),
+        'status_classes': charts.status_classes_chart(aggregates.status_class_counts()),
+        'requests_over_time': charts.requests_over_time_chart(aggregates.hourly_counts),
+        'bot_traffic': charts.bot_traffic_chart(aggregates.bot_counts(classifier)),
+        'request_methods': charts.request_methods_chart(aggregates.method_counts),
+    }
+    os.makedirs(directory, exist_ok=True)
+    for chart_name, fig in figures.items():
+        fig.savefig(os.path.join(directory, f"{chart_name}.png"))
+        plt.close(fig)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize web server access logs without the dashboard.")
+    parser.add_argument('logs', nargs='*', default=['-'],
+                        help="log files to analyze (plain or .gz); '-' reads stdin (default)")
+    parser.add_argument('-o', '--output', default='-',
+                        help="output directory, or '-' to print JSON to stdout (default)")
+    parser.add_argument('-f', '--format', choices=FORMATS, default='json', help="summary format (default: json)")
+    parser.add_argument('-n', '--top', type=int, default=10, help="number of top URLs and IPs (default: 10)")
+    parser.add_argument('--engine', choices=list(ENGINES), default='regex',
+                        help="parsing engine (default: regex; vectorized is about as fast and peaks slightly higher in memory)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="processes used to parse each uncompressed file (default: 1)")
+    parser.add_argument('-j', '--jobs', type=int, default=1, help="files analyzed in parallel (default: 1)")
+    parser.add_argument('--bot-pattern', action='append', default=[], metavar='PATTERN',
+                        help="extra user agent substring that marks a bot (repeatable)")
+    parser.add_argument('--combined', action='store_true', help="also write a summary over all logs together")
+    parser.add_argument('--charts', action='store_true', help="also render the dashboard charts as PNG files")
+    parser.add_argument('--approximate', action='store_true',
+                        help="also add sketch estimates: unique IPs, top URLs/IPs with error bounds, size percentiles")
+    parser.add_argument('--metrics-file', metavar='PATH',
+                        help="write the stage timings and line counts in the Prometheus text format, "
+                             "e.g. for node_exporter's textfile collector")
+    args = parser.parse_args(argv)
+    if args.output == '-' and (args.format != 'json' or args.charts):
+        parser.error("--format csv/parquet and --charts need an output directory (-o DIR)")
+    if args.logs.count('-') > 1 or ('-' in args.logs and args.jobs > 1):
+        parser.error("stdin ('-') can only be read once, and not together with --jobs")
+    for source in args.logs:
+        if source != '-' and not os.path.exists(source):
+            parser.error(f"{source}: no such file")
+        if os.path.isdir(source):
+            parser.error(f"{source}: is a directory")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    classifier = BotClassifier(DEFAULT_BOT_PATTERNS + [pattern.lower() for pattern in args.bot_pattern])
+
+    # Fan the logs out over processes; each one parses and summarizes a single file
+    if args.jobs > 1 and len(args.logs) > 1:
+        with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            results = list(executor.map(
+                analyze_log, args.logs, [args.engine] * len(args.logs), [1] * len(args.logs),
+                [args.approximate] * len(args.logs)
+            ))
+    else:
+        results = [analyze_log(source, args.engine, args.workers, args.approximate) for source in args.logs]
+
+    metrics = PipelineMetrics()
+    for *_, log_metrics in results:
+        metrics.merge(log_metrics)
+
+    combined = args.combined and len(args.logs) > 1
+    names = report_names(args.logs, reserved=['combined'] if combined else [])
+    named_results = [(name, *result[:3]) for name, result in zip(names, results)]
+    if combined:
+        # Aggregates and sketches are mergeable, so the combined report never needs the rows again
+        def merge_all(parts):
+            parts = [part for part in parts if part is not None]
+            return reduce(lambda left, right: left.merge(right), parts) if parts else None
+        with metrics.stage("aggregate: merge"):
+            named_results.append((
+                'combined',
+                merge_all(aggregates for _, aggregates, _, _ in named_results),
+                sum(unparsed for _, _, unparsed, _ in named_results),
+                merge_all(sketches for _, _, _, sketches in named_results),
+            ))
+
+    reports = []
+    for name, aggregates, unparsed, sketches in named_results:
+        report = build_report(name, aggregates, unparsed, args.top, classifier, sketches)
+        reports.append(report)
+        if args.output == '-':
+            continue
+        directory = os.path.join(args.output, name)
+        with metrics.stage(f"export: {args.format}"):
+            if args.format == 'json':
+                os.makedirs(directory, exist_ok=True)
+                with open(os.path.join(directory, 'summary.json'), 'w') as handle:
+                    json.dump(report, handle, indent=2)
+            else:
+                write_tables(directory, aggregates, report, args.format, args.top, classifier, sketches)
+        if args.charts and aggregates is not None:
+            with metrics.stage("render: charts"):
+                write_charts(directory, aggregates, args.top, classifier)
+
+    if args.output == '-':
+        json.dump(reports[0] if len(reports) == 1 else reports, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    if args.metrics_file:
+        write_prometheus(metrics, args.metrics_file)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,260 @@
+"""Summary tables shared by the dashboard tabs.
+
+The aggregates are built once per parsed log and are small, so every rerun of
+the Streamlit script only slices them instead of rescanning the rows.
+"""
+import re
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from log_parser import format_ipv4
+
+
+# Status classes by hundreds digit: 2xx success, 3xx redirect, 4xx client
+# error, and everything else counted as a server error
+STATUS_CLASSES = ['success', 'redirect', 'client_error', 'server_error']
+STATUS_CLASS_BY_HUNDREDS = np.array([3, 3, 0, 1, 2, 3, 3, 3, 3, 3], dtype=np.int8)
+
+DEFAULT_BOT_PATTERNS = ['bot', 'crawl', 'spider', 'slurp', 'bingbot', 'googlebot']
+MAX_BOT_VERDICTS = 100_000
+
+
+# Function to classify status codes with integer binning instead of a per-row function
+def classify_status(status):
+    codes = STATUS_CLASS_BY_HUNDREDS[np.asarray(status) // 100]
+    return pd.Categorical.from_codes(codes, categories=STATUS_CLASSES)
+
+
+# Bot detection over distinct user agents. Verdicts are memoized per user agent,
+# so a classifier reused across reruns only ever matches new user agents. The
+# memo is cleared once it holds max_verdicts user agents, which bounds its memory
+# when logs keep bringing new user agents.
+class BotClassifier:
+    def __init__(self, patterns=DEFAULT_BOT_PATTERNS, max_verdicts=MAX_BOT_VERDICTS):
+        self.patterns = tuple(patterns)
+        # One combined regex instead of a Python loop over the patterns
+        self.pattern = re.compile('|'.join(re.escape(pattern.lower()) for pattern in self.patterns))
+        self.max_verdicts = max_verdicts
+        self.verdicts = {}
+
+    def is_bot(self, user_agent):
+        verdict = self.verdicts.get(user_agent)
+        if verdict is None:
+            if len(self.verdicts) >= self.max_verdicts:
+                self.verdicts.clear()
+            verdict = self.verdicts[user_agent] = bool(self.pattern.search(user_agent.lower()))
+        return verdict
+
+    def classify_values(self, user_agents):
+        return np.array([self.is_bot(user_agent) for user_agent in user_agents], dtype=bool)
+
+    def classify(self, user_agents):
+        # Classify each distinct user agent once and broadcast the verdicts through the codes
+        if isinstance(user_agents.dtype, pd.CategoricalDtype):
+            codes, categories = user_agents.cat.codes.to_numpy(), user_agents.cat.categories
+        else:
+            codes, categories = pd.factorize(user_agents)
+        return self.classify_values(categories)[codes]
+
+
+# Function to add the derived columns of an export, classified once per distinct value
+def derive_export_columns(df, bot_classifier):
+    return df.assign(status_type=classify_status(df['status']), is_bot=bot_classifier.classify(df['user_agent']))
+
+
+# Count tables ordered by count, whose ties keep first-seen order
+RANKED_COUNTS = ['url_counts', 'ip_counts', 'method_counts', 'user_agent_counts']
+# The count tables that grow with every distinct URL and IP, left out (None) when sketches stand in for them
+SKETCHED_COUNTS = ['url_counts', 'ip_counts']
+
+
+# Precomputed summaries of one parsed log
+@dataclass
+class LogAggregates:
+    total_requests: int
+    success_count: int
+    url_counts: pd.Series
+    ip_counts: pd.Series
+    status_counts: pd.Series
+    method_counts: pd.Series
+    user_agent_counts: pd.Series
+    hourly_counts: pd.Series
+    size_counts: pd.Series
+    # First-seen position of each value of the ranked count tables, aligned with
+    # the tables, so that merged tables break ties like one count over all rows
+    first_seen: dict = field(default=None, repr=False, compare=False)
+
+    @property
+    def unique_ips(self):
+        return len(self.ip_counts) if self.ip_counts is not None else None
+
+    @property
+    def success_rate(self):
+        return self.success_count / self.total_requests * 100 if self.total_requests else 0.0
+
+    def top_urls(self, n):
+        return self.url_counts.head(n)
+
+    def top_ips(self, n):
+        return self.ip_counts.head(n)
+
+    def status_class_counts(self):
+        classes = classify_status(self.status_counts.index)
+        counts = self.status_counts.groupby(classes, observed=True).sum()
+        return counts.sort_values(ascending=False, kind='stable')
+
+    def merge(self, other):
+        # Combine the summaries of two disjoint sets of rows, e.g. newly appended
+        # lines; the rows of other come after the rows of self
+        ranked = {
+            name: add_counts(getattr(self, name), getattr(other, name),
+                             (self.first_seen or {}).get(name), (other.first_seen or {}).get(name))
+            if getattr(self, name) is not None and getattr(other, name) is not None else (None, None)
+            for name in RANKED_COUNTS
+        }
+        return LogAggregates(
+            total_requests=self.total_requests + other.total_requests,
+            success_count=self.success_count + other.success_count,
+            status_counts=self.status_counts.add(other.status_counts, fill_value=0).astype(np.int64).sort_index(),
+            hourly_counts=self.hourly_counts.add(other.hourly_counts, fill_value=0).astype(np.int64).sort_index(),
+            size_counts=self.size_counts.add(other.size_counts, fill_value=0).astype(np.int64).sort_index(),
+            first_seen={name: first_seen for name, (_, first_seen) in ranked.items()},
+            **{name: counts for name, (counts, _) in ranked.items()},
+        )
+
+    def size_percentiles(self, percentiles):
+        # Interpolated between the two nearest ranks like Series.quantile, from
+        # the count of each distinct size instead of the sorted sizes
+        quantiles = np.asarray(percentiles) / 100
+        sizes = self.size_counts.index.to_numpy().astype(np.float64)
+        cumulative = np.cumsum(self.size_counts.to_numpy())
+        positions = (self.total_requests - 1) * quantiles
+        below = np.floor(positions)
+        lower = sizes[np.searchsorted(cumulative, below, side='right')]
+        upper = sizes[np.minimum(np.searchsorted(cumulative, below + 1, side='right'), len(sizes) - 1)]
+        fraction = positions - below
+        values = np.where(fraction >= 0.5, upper - (upper - lower) * (1 - fraction),
+                          lower + (upper - lower) * fraction)
+        return pd.DataFrame({'percentile': percentiles, 'size': values})
+
+    def bot_counts(self, classifier):
+        # Only the distinct user agents are classified, weighted by their counts
+        is_bot = classifier.classify_values(self.user_agent_counts.index)
+        counts = pd.Series(
+            [self.user_agent_counts[~is_bot].sum(), self.user_agent_counts[is_bot].sum()],
+            index=[False, True], name='count'
+        ).rename_axis('is_bot')
+        return counts[counts > 0]
+
+
+# Function to count a column by value, in the order the values first appear
+# (categories are interned in first-seen order by the parser)
+def count_first_seen(column):
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        # Categorical codes can be counted with a bincount instead of hashing
+        codes = column.cat.codes.to_numpy()
+        counts = np.bincount(codes[codes >= 0], minlength=len(column.cat.categories))
+        counts = pd.Series(counts, index=column.cat.categories.astype(object), name='count')
+        counts = counts[counts > 0]
+    else:
+        counts = column.value_counts(sort=False)
+    counts.index.name = column.name
+    return counts
+
+
+# Function to order a count table in first-seen order by count, most frequent first,
+# also returning the first-seen position of each value
+def rank_counts(counts):
+    first_seen = np.argsort(-counts.to_numpy(), kind='stable')
+    return counts.iloc[first_seen], first_seen
+
+
+# Function to count a column by value, most frequent first (ties keep first-seen order)
+def count_values(column):
+    return rank_counts(count_first_seen(column))[0]
+
+
+# Function to add two count tables, most frequent first, also returning the
+# first-seen position of each value. Values missing from the left table were
+# first seen after all of its values. Without positions, a table's own order is used.
+def add_counts(left, right, left_first_seen=None, right_first_seen=None):
+    left_first_seen = np.arange(len(left)) if left_first_seen is None else left_first_seen
+    right_first_seen = np.arange(len(right)) if right_first_seen is None else right_first_seen
+    positions = left.index.get_indexer(right.index)
+    new = positions < 0
+    right_values = right.to_numpy(np.int64)
+    counts = np.concatenate([left.to_numpy(np.int64), right_values[new]])
+    counts[positions[~new]] += right_values[~new]
+    first_seen = np.concatenate([
+        left_first_seen, len(left) + np.argsort(np.argsort(right_first_seen[new], kind='stable'), kind='stable')
+    ])
+    # The left rows the right table does not touch keep their order, so only the
+    # touched and new rows are sorted, then inserted among them by binary search
+    moved = np.concatenate([positions[~new], np.arange(len(left), len(counts))])
+    moved = moved[np.lexsort((first_seen[moved], -counts[moved]))]
+    kept = np.ones(len(left), dtype=bool)
+    kept[positions[~new]] = False
+    kept = np.flatnonzero(kept)
+    # First-seen positions are below len(counts), so one integer orders by count, then first seen
+    def sort_key(rows):
+        return -counts[rows] * len(counts) + first_seen[rows]
+    order = np.insert(kept, np.searchsorted(sort_key(kept), sort_key(moved)), moved)
+    # Appending object indexes infers a string dtype, so keep the left table's dtype
+    index = left.index.append(right.index[new]).astype(left.index.dtype) if len(left) else right.index[new]
+    return pd.Series(counts[order], index=index[order], name=left.name), first_seen[order]
+
+
+# Function to build all summaries of a parsed log
+def build_aggregates(df, exact_counts=True):
+    status = df['status'].to_numpy()
+    # Status codes are small integers, so a bincount indexed by code is enough
+    status_counts = pd.Series(np.bincount(status), name='count').rename_axis('status')
+    # Without exact counts, the URL and IP tables are not built at all (see SKETCHED_COUNTS)
+    ranked = {
+        name: rank_counts(count_first_seen(df[column])) if exact_counts or name not in SKETCHED_COUNTS
+        else (None, None)
+        for name, column in zip(RANKED_COUNTS, ['url', 'ip', 'method', 'user_agent'])
+    }
+    return LogAggregates(
+        total_requests=len(df),
+        success_count=int((status < 400).sum()),
+        status_counts=status_counts[status_counts > 0],
+        hourly_counts=df['hour'].value_counts(sort=False).sort_index(),
+        size_counts=df['size'].value_counts(sort=False).sort_index(),
+        first_seen={name: first_seen for name, (_, first_seen) in ranked.items()},
+        **{name: counts for name, (counts, _) in ranked.items()},
+    )
+
+
+# Function to compute the Overview metrics of a log
+def overview(aggregates):
+    peak_hour = aggregates.hourly_counts.idxmax() if len(aggregates.hourly_counts) else None
+    return {
+        'total_requests': aggregates.total_requests,
+        'unique_ips': aggregates.unique_ips,
+        'success_rate': round(aggregates.success_rate, 2),
+        'error_rate': round(100 - aggregates.success_rate, 2),
+        'peak_hour': None if peak_hour is None else peak_hour.isoformat(),
+        'peak_hour_requests': 0 if peak_hour is None else int(aggregates.hourly_counts.max()),
+    }
+
+
+# Function to build the tables behind the dashboard tabs as plain DataFrames
+def summary_tables(aggregates, top_n=10, classifier=None):
+    classifier = classifier or BotClassifier()
+    top_ips = aggregates.top_ips(top_n)
+    bot_counts = aggregates.bot_counts(classifier)
+    return {
+        'top_urls': aggregates.top_urls(top_n).rename_axis('url').reset_index(),
+        'top_ips': pd.DataFrame({'ip': format_ipv4(top_ips.index), 'count': top_ips.to_numpy()}),
+        'status_codes': aggregates.status_counts.rename_axis('status').reset_index(),
+        'status_classes': aggregates.status_class_counts().rename_axis('status_class').reset_index(),
+        'requests_per_hour': aggregates.hourly_counts.rename_axis('hour').reset_index(),
+        'bot_traffic': pd.DataFrame({
+            'traffic': ['bot' if is_bot else 'human' for is_bot in bot_counts.index],
+            'count': bot_counts.to_numpy(),
+        }),
+        'methods': aggregates.method_counts.rename_axis('method').reset_index(),
+    }
@@ -0,0 +1,133 @@
+"""On-demand export of parsed logs to files.
+
+Rows are written in chunks straight to a file, so an export never holds the
+whole CSV text (let alone a base64 copy of it) in memory.
+"""
+import gzip
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from log_parser import format_ipv4
+
+EXPORT_CHUNK_ROWS = 100_000
+# Exports are written to one directory, where files older than EXPORT_MAX_AGE
+# seconds (e.g. left behind by sessions that ended) are deleted
+EXPORT_DIR = os.path.join(tempfile.gettempdir(), 'web_log_exports')
+EXPORT_MAX_AGE = 3600
+
+# Export formats: label -> (file extension, mime type)
+EXPORT_FORMATS = {
+    "CSV (gzip)": ("csv.gz", "application/gzip"),
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+
+
+# Function to format fixed-offset timestamps the way to_csv does, but formatting
+# each distinct second once with numpy instead of every row through pandas
+def format_timestamps(column):
+    offset = column.dt.tz.utcoffset(None) if column.dt.tz is not None else None
+    local = column.dt.tz_localize(None).to_numpy()
+    if offset is None or (local.astype(np.int64) % 10**9).any():
+        return column
+    minutes = int(offset.total_seconds()) // 60
+    suffix = f"{'-' if minutes < 0 else '+'}{abs(minutes) // 60:02d}:{abs(minutes) % 60:02d}"
+    codes, uniques = pd.factorize(local.astype('datetime64[s]'))
+    text = np.char.add(np.char.replace(np.asarray(uniques).astype(str), 'T', ' '), suffix)
+    return text.astype(object)[codes]
+
+
+# Function to yield chunks of rows from a DataFrame, or pass through frames that
+# are already chunked (e.g. LogStore.iter_frames)
+def iter_frames(source, chunk_rows=EXPORT_CHUNK_ROWS):
+    if isinstance(source, pd.DataFrame):
+        for start in range(0, len(source), chunk_rows):
+            yield source.iloc[start:start + chunk_rows]
+    else:
+        yield from source
+
+
+# Function to yield export-ready chunks of rows (IPs as dotted strings, categories as plain strings)
+def iter_export_chunks(df, chunk_rows=EXPORT_CHUNK_ROWS, as_parquet=False):
+    for chunk in iter_frames(df, chunk_rows):
+        columns = {}
+        for name, column in chunk.items():
+            if name == 'ip':
+                columns[name] = format_ipv4(column)
+            elif isinstance(column.dtype, pd.DatetimeTZDtype) and not as_parquet:
+                columns[name] = format_timestamps(column)
+            elif isinstance(column.dtype, pd.CategoricalDtype):
+                columns[name] = column.astype(object)
+            else:
+                columns[name] = column
+        yield pd.DataFrame(columns, index=chunk.index)
+
+
+# Function to write rows as CSV, optionally gzip-compressed, chunk by chunk
+def write_csv(df, path, compress=False, chunk_rows=EXPORT_CHUNK_ROWS):
+    opener = gzip.open if compress else open
+    with opener(path, 'wt', newline='', encoding='utf-8') as handle:
+        for number, chunk in enumerate(iter_export_chunks(df, chunk_rows)):
+            chunk.to_csv(handle, header=number == 0, index=False)
+
+
+# Function to write rows as Parquet, one row group per chunk
+def write_parquet(df, path, chunk_rows=EXPORT_CHUNK_ROWS):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    try:
+        for chunk in iter_export_chunks(df, chunk_rows, as_parquet=True):
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema, compression='zstd')
+            writer.write_table(table.cast(writer.schema))
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+# Function to delete an export file, if it still exists
+def remove_export(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+# Function to delete the exports in a directory that are older than max_age seconds
+def prune_exports(directory=EXPORT_DIR, max_age=EXPORT_MAX_AGE):
+    cutoff = time.time() - max_age
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                remove_export(entry.path)
+        except FileNotFoundError:
+            pass
+
+
+# Function to export rows to a new temporary file in the given format, returning its path
+def export_to_file(df, export_format, chunk_rows=EXPORT_CHUNK_ROWS, directory=EXPORT_DIR):
+    extension, _ = EXPORT_FORMATS[export_format]
+    os.makedirs(directory, exist_ok=True)
+    prune_exports(directory)
+    handle, path = tempfile.mkstemp(prefix='web_log_data_', suffix=f'.{extension}', dir=directory)
+    os.close(handle)
+    try:
+        if export_format == "Parquet":
+            write_parquet(df, path, chunk_rows)
+        else:
+            write_csv(df, path, compress=export_format == "CSV (gzip)", chunk_rows=chunk_rows)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
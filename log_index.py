@@ -0,0 +1,112 @@
+"""Fast filtering of a parsed log by time window and field values.
+
+A LogIndex keeps the rows sorted by timestamp, so a time window is two binary
+searches, and keeps one boolean mask per filterable value, so changing the
+filters only combines masks over the selected window. Masks are built on first
+use, and an index over rows that grow (a live tail) only extends them.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+from log_analysis import STATUS_CLASSES, classify_status
+
+
+# Sidebar filter selection. Empty selections do not filter; the time window
+# is [start_ns, end_ns) in nanoseconds since the epoch.
+@dataclass(frozen=True)
+class LogFilter:
+    start_ns: int = None
+    end_ns: int = None
+    status_classes: tuple = ()
+    methods: tuple = ()
+    is_bot: bool = None
+    bot_patterns: tuple = ()
+    url_prefix: str = ''
+
+    @property
+    def active(self):
+        return (self.start_ns is not None or self.end_ns is not None or bool(self.status_classes)
+                or bool(self.methods) or self.is_bot is not None or bool(self.url_prefix))
+
+
+# Function to get the timestamps of a tz-aware datetime column as epoch nanoseconds
+def epoch_ns(column):
+    return column.dt.tz_convert('UTC').dt.tz_localize(None).to_numpy().astype('datetime64[ns]').view(np.int64)
+
+
+# Time-sorted rows of one parsed log with per-value masks for filtering
+class LogIndex:
+    def __init__(self, df, times=None):
+        # Rows that are already in time order can pass their epoch nanoseconds
+        if times is None:
+            times = epoch_ns(df['datetime'])
+            if len(times) and (np.diff(times) < 0).any():
+                # Logs are nearly always written in time order, so this is rarely needed
+                order = np.argsort(times, kind='stable')
+                df = df.take(order).reset_index(drop=True)
+                times = times[order]
+        self.df = df
+        self.times = times
+        self.masks = {}
+
+    def extend(self, df, times, start):
+        # Move on to grown rows (still in time order) whose first `start` rows
+        # are unchanged; the masks of those rows are kept and the rest are redone
+        self.df = df
+        self.times = times
+        self.masks = {key: mask[:start] for key, mask in self.masks.items()}
+
+    def mask(self, key, compute):
+        # Masks are built on first use and kept; compute(start, end) returns the
+        # mask of rows [start, end), so a mask that is shorter than the rows is extended
+        mask = self.masks.get(key)
+        done = 0 if mask is None else len(mask)
+        if done < len(self.times):
+            part = compute(done, len(self.times))
+            mask = self.masks[key] = part if mask is None else np.concatenate([mask, part])
+        return mask
+
+    def status_class_mask(self, name):
+        code = STATUS_CLASSES.index(name)
+        return self.mask(('status_class', name),
+                         lambda start, end: np.asarray(classify_status(self.df['status'][start:end]).codes) == code)
+
+    def time_bounds(self):
+        column = self.df['datetime']
+        return column.iloc[0], column.iloc[-1]
+
+    def window(self, start_ns=None, end_ns=None):
+        # Binary search for the rows in [start_ns, end_ns)
+        start = 0 if start_ns is None else int(np.searchsorted(self.times, start_ns, side='left'))
+        end = len(self.times) if end_ns is None else int(np.searchsorted(self.times, end_ns, side='left'))
+        return start, max(start, end)
+
+    def value_mask(self, column, value):
+        categories = self.df[column].cat.categories
+        code = categories.get_loc(value) if value in categories else -1
+        return self.mask((column, value), lambda start, end: self.df[column].cat.codes.to_numpy()[start:end] == code)
+
+    def bot_mask(self, classifier):
+        return self.mask(('is_bot', classifier.patterns),
+                         lambda start, end: classifier.classify(self.df['user_agent'][start:end]))
+
+    def prefix_mask(self, column, prefix, start, end):
+        # Match the prefix once per distinct value, then broadcast through the codes
+        matches = self.df[column].cat.categories.str.startswith(prefix)
+        return np.asarray(matches)[self.df[column].cat.codes.to_numpy()[start:end]]
+
+    def select(self, filters, classifier):
+        start, end = self.window(filters.start_ns, filters.end_ns)
+        parts = []
+        if filters.status_classes:
+            parts.append(np.logical_or.reduce([self.status_class_mask(name)[start:end] for name in filters.status_classes]))
+        if filters.methods:
+            parts.append(np.logical_or.reduce([self.value_mask('method', method)[start:end] for method in filters.methods]))
+        if filters.is_bot is not None:
+            bots = self.bot_mask(classifier)[start:end]
+            parts.append(bots if filters.is_bot else ~bots)
+        if filters.url_prefix:
+            parts.append(self.prefix_mask('url', filters.url_prefix, start, end))
+        rows = self.df.iloc[start:end]
+        return rows[np.logical_and.reduce(parts)] if parts else rows
@@ -0,0 +1,434 @@
+"""Parsing of web server access logs into pandas DataFrames.
+
+Kept separate from the Streamlit app so that the parser can be imported by
+process-pool workers.
+"""
+import io
+import os
+import re
+import zlib
+import shutil
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+# Access log line format (combined log format)
+LOG_PATTERN = re.compile(
+    r'(?P<ip>\d+\.\d+\.\d+\.\d+)\s'                  # IP address
+    r'- - \[(?P<datetime>[^\]]+)\]\s'                 # Timestamp
+    r'"(?P<method>\w+)\s(?P<url>\S+)\sHTTP/\d\.\d"\s' # HTTP Method, URL
+    r'(?P<status>\d{3})\s(?P<size>\d+|-)\s'           # Status code, Size
+    r'"(?P<referrer>[^"]*)"\s'                        # Referrer
+    r'"(?P<user_agent>[^"]*)"'                        # User Agent
+)
+LOG_COLUMNS = list(LOG_PATTERN.groupindex)
+
+# Uploads are read in fixed-size byte chunks so that the raw file, the decoded
+# text and the parsed rows never have to exist in memory all at once
+CHUNK_SIZE = 4 * 1024 * 1024
+GZIP_MAGIC = b'\x1f\x8b'
+
+# Function to read a binary stream in chunks, transparently decompressing gzip
+def iter_chunks(stream, chunk_size=CHUNK_SIZE):
+    chunk = stream.read(chunk_size)
+    if not chunk.startswith(GZIP_MAGIC):
+        while chunk:
+            yield chunk
+            chunk = stream.read(chunk_size)
+        return
+
+    # Rotated logs (access.log.1.gz) may hold several concatenated gzip members
+    decompressor = zlib.decompressobj(wbits=31)
+    while chunk:
+        # Bound the decompressed output per step instead of inflating a whole chunk
+        data = decompressor.decompress(chunk, chunk_size)
+        if data:
+            yield data
+        if decompressor.eof:
+            chunk = decompressor.unused_data or stream.read(chunk_size)
+            decompressor = zlib.decompressobj(wbits=31)
+        elif decompressor.unconsumed_tail:
+            chunk = decompressor.unconsumed_tail
+        else:
+            chunk = stream.read(chunk_size)
+
+# Function to split a chunked byte stream into batches of complete lines
+def iter_line_batches(stream, chunk_size=CHUNK_SIZE):
+    remainder = b''
+    for chunk in iter_chunks(stream, chunk_size):
+        data = remainder + chunk
+        cut = data.rfind(b'\n')
+        if cut < 0:
+            remainder = data
+            continue
+        remainder = data[cut + 1:]
+        yield data[:cut].decode('utf-8', errors='replace').split('\n')
+    if remainder:
+        yield [remainder.decode('utf-8', errors='replace')]
+
+# Access log timestamps have a fixed layout: 12/Jan/2020:10:15:35 +0000
+TIMESTAMP_WIDTH = 26
+TIMESTAMP_DIGITS = [0, 1, 7, 8, 9, 10, 12, 13, 15, 16, 18, 19, 22, 23, 24, 25]
+TIMESTAMP_SEPARATORS = {2: b'/', 6: b'/', 11: b':', 14: b':', 17: b':', 20: b' '}
+MONTH_NAMES = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+DAYS_IN_MONTH = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+NS_PER_SECOND = 10**9
+NS_PER_HOUR = 3600 * NS_PER_SECOND
+MIN_YEAR, MAX_YEAR = pd.Timestamp.min.year + 1, pd.Timestamp.max.year - 1
+
+# Month-name lookup table: the three lowercase month letters packed into one integer
+MONTH_KEYS = np.array([int.from_bytes(name.lower().encode(), 'big') for name in MONTH_NAMES])
+MONTH_ORDER = np.argsort(MONTH_KEYS)
+MONTH_KEYS_SORTED = MONTH_KEYS[MONTH_ORDER]
+
+# Function to decode timestamps into UTC epoch nanoseconds and UTC offsets in minutes
+def decode_timestamps(values):
+    # Busy logs repeat the same second thousands of times, so every distinct
+    # timestamp string is decoded once and the result is broadcast back by code
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+    n = len(uniques)
+    valid = np.array([isinstance(value, str) and len(value) == TIMESTAMP_WIDTH and value.isascii()
+                      for value in uniques], dtype=bool)
+    raw = np.array([value if ok else '' for value, ok in zip(uniques, valid)], dtype=f'S{TIMESTAMP_WIDTH}')
+    chars = raw.view(np.uint8).reshape(n, TIMESTAMP_WIDTH).astype(np.int64)
+
+    digits = chars[:, TIMESTAMP_DIGITS] - ord('0')
+    valid &= ((digits >= 0) & (digits <= 9)).all(axis=1)
+    for position, separator in TIMESTAMP_SEPARATORS.items():
+        valid &= chars[:, position] == ord(separator)
+    sign = np.where(chars[:, 21] == ord('-'), -1, 1)
+    valid &= (chars[:, 21] == ord('+')) | (chars[:, 21] == ord('-'))
+
+    day = digits[:, 0] * 10 + digits[:, 1]
+    year = digits[:, 2] * 1000 + digits[:, 3] * 100 + digits[:, 4] * 10 + digits[:, 5]
+    hour = digits[:, 6] * 10 + digits[:, 7]
+    minute = digits[:, 8] * 10 + digits[:, 9]
+    second = digits[:, 10] * 10 + digits[:, 11]
+    offset = sign * ((digits[:, 12] * 10 + digits[:, 13]) * 60 + digits[:, 14] * 10 + digits[:, 15])
+
+    # Month names are matched case-insensitively, like strptime's %b. Setting bit 5
+    # lowercases ASCII letters, and no other byte maps onto a lowercase letter.
+    month_key = ((chars[:, 3] | 0x20) << 16) | ((chars[:, 4] | 0x20) << 8) | (chars[:, 5] | 0x20)
+    slot = np.minimum(np.searchsorted(MONTH_KEYS_SORTED, month_key), len(MONTH_NAMES) - 1)
+    valid &= MONTH_KEYS_SORTED[slot] == month_key
+    month = MONTH_ORDER[slot] + 1
+
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    month_length = DAYS_IN_MONTH[month - 1] + (leap & (month == 2))
+    # Seconds up to 61 are allowed, as by strptime's %S, and roll over into the next minute
+    valid &= (day >= 1) & (day <= month_length) & (hour < 24) & (minute < 60) & (second <= 61)
+    valid &= (digits[:, 12] * 10 + digits[:, 13] < 24) & (digits[:, 14] * 10 + digits[:, 15] < 60)
+    # Years outside the datetime64[ns] range cannot be represented
+    valid &= (year >= MIN_YEAR) & (year <= MAX_YEAR)
+
+    # Days since the epoch from the civil date (proleptic Gregorian calendar)
+    shifted_year = year - (month <= 2)
+    era = shifted_year // 400
+    year_of_era = shifted_year - era * 400
+    day_of_year = (153 * ((month + 9) % 12) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    days = era * 146097 + day_of_era - 719468
+
+    seconds = days * 86400 + hour * 3600 + minute * 60 + second - offset * 60
+    epoch_ns = np.where(valid, seconds * NS_PER_SECOND, 0)
+    return epoch_ns[codes], offset[codes].astype(np.int16), valid[codes]
+
+# Function to build the datetime and hour columns from decoded timestamps
+def timestamp_columns(epoch_ns, offsets):
+    offsets = np.asarray(offsets)
+    if len(offsets) and (offsets == offsets[0]).all():
+        tz = timezone(timedelta(minutes=int(offsets[0])))
+    else:
+        # Mixed UTC offsets cannot share one fixed-offset dtype, so use UTC
+        tz = timezone.utc
+        offsets = np.zeros(len(offsets), dtype=np.int16)
+
+    # Floor to the hour in local time using integer arithmetic
+    offset_ns = offsets.astype(np.int64) * 60 * NS_PER_SECOND
+    local_ns = epoch_ns + offset_ns
+    hour_ns = local_ns - local_ns % NS_PER_HOUR - offset_ns
+
+    def to_datetime(values):
+        return pd.Series(values.view('datetime64[ns]')).dt.tz_localize('UTC').dt.tz_convert(tz)
+
+    return to_datetime(epoch_ns), to_datetime(hour_ns)
+
+# Repetitive string columns are interned while parsing and stored as categories
+CATEGORY_COLUMNS = ['method', 'url', 'referrer', 'user_agent']
+
+# Function to create the interning tables (value -> code, in first-seen order)
+def new_interners():
+    return {name: {} for name in CATEGORY_COLUMNS}
+
+# Function to intern a column of strings in bulk, returning their codes
+def intern_values(values, codes_by_value):
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+    mapping = np.array([codes_by_value.setdefault(value, len(codes_by_value)) for value in uniques], dtype=np.int32)
+    return mapping[codes]
+
+# Function to pack dotted IPv4 addresses into uint32, decoding each distinct address once
+def pack_ipv4(values):
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+    # The log pattern guarantees four dot-separated digit groups per address
+    octets = np.array('.'.join(uniques).split('.'), dtype='U4').reshape(-1, 4)
+    valid = (np.char.str_len(octets) <= 3).all(axis=1)
+    octets = np.where(valid[:, None], octets, '0').astype(np.int64)
+    valid &= (octets <= 255).all(axis=1)
+    packed = (octets[:, 0] << 24) | (octets[:, 1] << 16) | (octets[:, 2] << 8) | octets[:, 3]
+    return np.where(valid, packed, 0).astype(np.uint32)[codes], valid[codes]
+
+# Function to format packed uint32 IPv4 addresses as dotted strings (for display and export)
+def format_ipv4(values):
+    packed = np.asarray(values, dtype=np.uint32).astype(np.int64)
+    octets = [pd.Series((packed >> shift) & 255).astype(str) for shift in (24, 16, 8, 0)]
+    return (octets[0] + '.' + octets[1] + '.' + octets[2] + '.' + octets[3]).to_numpy(dtype=object)
+
+MAX_SIZE_DIGITS = 18
+
+# Function to convert the timestamp, address and numeric columns of a parsed batch in bulk
+def convert_batch(batch):
+    if not batch.empty:
+        epoch_ns, offsets, valid_timestamps = decode_timestamps(batch['datetime'])
+        ips, valid_ips = pack_ipv4(batch['ip'])
+        batch['ip'] = ips
+        batch['datetime'] = epoch_ns
+        batch['tz_offset'] = offsets
+        # Sizes of up to 18 digits always fit an int64 (larger ones are no real response)
+        valid_sizes = (batch['size'].str.len() <= MAX_SIZE_DIGITS).to_numpy()
+        # Lines with an undecodable timestamp, address or size are counted as unparsed
+        valid = valid_timestamps & valid_ips & valid_sizes
+        if not valid.all():
+            batch = batch[valid].reset_index(drop=True)
+        batch['status'] = batch['status'].astype(np.uint16)
+        batch['size'] = batch['size'].where(batch['size'] != '-', '0').astype(np.int64)
+    return batch
+
+# Function to parse one batch of lines line by line with the compiled regex
+def parse_batch(lines, interners):
+    ips, timestamps, statuses, sizes = [], [], [], []
+    methods, urls, referrers, user_agents = [], [], [], []
+    method_codes, url_codes, referrer_codes, user_agent_codes = (interners[name] for name in CATEGORY_COLUMNS)
+    match_line = LOG_PATTERN.match
+    non_empty = 0
+    for line in lines:
+        if line.strip():  # Skip empty lines
+            non_empty += 1
+            match = match_line(line)
+            if match:
+                ip, timestamp, method, url, status, size, referrer, user_agent = match.groups()
+                ips.append(ip)
+                timestamps.append(timestamp)
+                statuses.append(status)
+                sizes.append(size)
+                # Intern the repetitive strings straight away instead of keeping one str per row
+                methods.append(method_codes.setdefault(method, len(method_codes)))
+                urls.append(url_codes.setdefault(url, len(url_codes)))
+                referrers.append(referrer_codes.setdefault(referrer, len(referrer_codes)))
+                user_agents.append(user_agent_codes.setdefault(user_agent, len(user_agent_codes)))
+
+    matched = len(ips)
+    batch = convert_batch(pd.DataFrame({
+        'ip': pd.Series(ips, dtype=object),
+        'datetime': pd.Series(timestamps, dtype=object),
+        'method': np.array(methods, dtype=np.int32),
+        'url': np.array(urls, dtype=np.int32),
+        'status': pd.Series(statuses, dtype=object),
+        'size': pd.Series(sizes, dtype=object),
+        'referrer': np.array(referrers, dtype=np.int32),
+        'user_agent': np.array(user_agents, dtype=np.int32),
+    }))
+    return batch, non_empty - len(batch), non_empty - matched
+
+# The log pattern anchored at every line start of a joined batch, with field
+# separators that cannot cross a newline
+BATCH_PATTERN = re.compile('^' + LOG_PATTERN.pattern.replace(r'\s', r'[^\S\n]'), re.MULTILINE)
+# Groups that could still run into the next line when a line is cut short
+FREE_TEXT_COLUMNS = [LOG_COLUMNS.index(name) for name in ('datetime', 'referrer', 'user_agent')]
+
+# Function to parse one batch of lines with a single findall over the joined batch
+def parse_batch_vectorized(lines, interners):
+    non_empty = sum(map(bool, map(str.strip, lines)))  # Skip empty lines
+    # findall scans the whole batch in C and returns the groups of each matching line
+    matches = BATCH_PATTERN.findall('\n'.join(lines))
+    rows = np.array(matches, dtype=object).reshape(-1, len(LOG_COLUMNS))
+    if any('\n' in '\x00'.join(rows[:, column]) for column in FREE_TEXT_COLUMNS):
+        # A match spans two lines, so this (rare) batch is parsed line by line instead
+        return parse_batch(lines, interners)
+    batch = convert_batch(pd.DataFrame({
+        name: intern_values(rows[:, column], interners[name]) if name in CATEGORY_COLUMNS
+        else pd.Series(rows[:, column], dtype=object)
+        for column, name in enumerate(LOG_COLUMNS)
+    }))
+    return batch, non_empty - len(batch), non_empty - len(matches)
+
+# Available parsing engines, selectable from the sidebar. Each returns the
+# parsed batch, the number of unparsed lines and how many of those the regex rejected.
+# Both are bound by the regex itself, so they parse at about the same speed: the batch
+# engine saves the per-line loop, but holds the joined batch and all of its matches at
+# once, which peaks about 10% higher in memory.
+PARSE_ENGINES = {
+    "Regex (line by line)": parse_batch,
+    "Batch regex (one findall per batch)": parse_batch_vectorized,
+}
+
+DEFAULT_ENGINE = "Regex (line by line)"
+
+# Function to parse batches of lines into raw batches (timestamps still as epoch ns).
+# Passing existing interners keeps category codes stable across calls.
+def parse_line_batches(line_batches, engine=DEFAULT_ENGINE, interners=None):
+    parse_lines = PARSE_ENGINES[engine]
+    if interners is None:
+        interners = new_interners()
+    batches = []
+    unparsed_lines = rejected_lines = 0
+    for lines in line_batches:
+        batch, unparsed, rejected = parse_lines(lines, interners)
+        unparsed_lines += unparsed
+        rejected_lines += rejected
+        if not batch.empty:
+            batches.append(batch)
+    return batches, unparsed_lines, interners, rejected_lines
+
+# Function to parse a binary stream into raw batches
+def parse_stream(stream, chunk_size=CHUNK_SIZE, engine=DEFAULT_ENGINE):
+    return parse_line_batches(iter_line_batches(stream, chunk_size), engine)
+
+# Function to combine raw batches into the final compact DataFrame
+def finalize_batches(batches, unparsed_lines, interners, rejected_lines=None, drop_unused_categories=True):
+    if not batches:
+        df = pd.DataFrame(columns=LOG_COLUMNS)
+    else:
+        # Create DataFrame
+        df = pd.concat(batches, ignore_index=True) if len(batches) > 1 else batches[0]
+        del batches
+        for name in CATEGORY_COLUMNS:
+            column = pd.Categorical.from_codes(df[name].to_numpy(), categories=list(interners[name]))
+            # Rows dropped after interning may leave unused categories behind
+            df[name] = column.remove_unused_categories() if drop_unused_categories else column
+        if df['size'].max() < 2**32:
+            df['size'] = df['size'].astype(np.uint32)
+        # Add hour column for time analysis
+        df['datetime'], df['hour'] = timestamp_columns(df['datetime'].to_numpy(), df.pop('tz_offset').to_numpy())
+
+    # Lines that did not match the log format are reported in the sidebar;
+    # the rest of the unparsed lines matched but had an invalid timestamp or address
+    df.attrs['unparsed_lines'] = unparsed_lines
+    df.attrs['rejected_lines'] = unparsed_lines if rejected_lines is None else rejected_lines
+    return df
+
+# Function to parse logs from text, bytes, a file path or a binary file-like object (e.g. an upload)
+def parse_logs(log_content, chunk_size=CHUNK_SIZE, engine=DEFAULT_ENGINE):
+    if isinstance(log_content, os.PathLike):
+        with open(log_content, 'rb') as stream:
+            return parse_logs(stream, chunk_size, engine)
+    if isinstance(log_content, str):
+        log_content = log_content.encode('utf-8')
+    if isinstance(log_content, bytes):
+        log_content = io.BytesIO(log_content)
+
+    # Parse batch by batch, keeping only the parsed columns of each batch
+    return finalize_batches(*parse_stream(log_content, chunk_size, engine))
+
+# Read-only view of a byte range of a file, used by the parallel parser
+class FileRange:
+    def __init__(self, stream, start, end):
+        stream.seek(start)
+        self.stream = stream
+        self.remaining = end - start
+
+    def read(self, size):
+        data = self.stream.read(min(size, self.remaining))
+        self.remaining -= len(data)
+        return data
+
+# Function to split a file into byte ranges that start and end on line boundaries
+def split_file_ranges(path, parts):
+    total = os.path.getsize(path)
+    boundaries = [0]
+    with open(path, 'rb') as stream:
+        for part in range(1, parts):
+            stream.seek(max(total * part // parts, boundaries[-1]))
+            stream.readline()  # Move to the start of the next line
+            position = stream.tell()
+            if position >= total:
+                break
+            if position > boundaries[-1]:
+                boundaries.append(position)
+    boundaries.append(total)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+# Worker: parse one byte range and return compact columns (numpy arrays, not rows)
+# together with the worker's own category values
+def parse_file_range(path, start, end, chunk_size, engine):
+    with open(path, 'rb') as stream:
+        batches, unparsed_lines, interners, rejected_lines = parse_stream(
+            FileRange(stream, start, end), chunk_size, engine
+        )
+    categories = {name: list(codes_by_value) for name, codes_by_value in interners.items()}
+    if not batches:
+        return {}, unparsed_lines, categories, rejected_lines
+    combined = pd.concat(batches, ignore_index=True) if len(batches) > 1 else batches[0]
+    columns = {name: combined[name].to_numpy() for name in combined.columns}
+    return columns, unparsed_lines, categories, rejected_lines
+
+# Function to parse a log file on several cores. The result matches parse_logs row for row.
+def parse_logs_parallel(path, workers=None, chunk_size=CHUNK_SIZE, engine=DEFAULT_ENGINE, progress=None):
+    workers = workers or os.cpu_count() or 1
+    with open(path, 'rb') as stream:
+        compressed = stream.read(len(GZIP_MAGIC)) == GZIP_MAGIC
+
+    # Gzip streams cannot be split, and small files are not worth the pool start-up
+    total = os.path.getsize(path)
+    if workers < 2 or compressed or total < 2 * chunk_size:
+        with open(path, 'rb') as stream:
+            df = parse_logs(stream, chunk_size, engine)
+        if progress:
+            progress(1.0)
+        return df
+
+    # A few ranges per worker keeps the cores busy and the progress bar moving
+    ranges = split_file_ranges(path, min(workers * 4, max(total // chunk_size, 1)))
+    results = [None] * len(ranges)
+    parsed_bytes = 0
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        futures = {
+            executor.submit(parse_file_range, os.fspath(path), start, end, chunk_size, engine): index
+            for index, (start, end) in enumerate(ranges)
+        }
+        for future in as_completed(futures):
+            index = futures[future]
+            results[index] = future.result()
+            start, end = ranges[index]
+            parsed_bytes += end - start
+            if progress:
+                progress(parsed_bytes / total)
+
+    # Concatenate the ranges in file order, remapping each worker's category
+    # codes onto shared tables so that categories keep their first-seen order
+    interners = new_interners()
+    batches = []
+    for columns, _, categories, _ in results:
+        for name in CATEGORY_COLUMNS:
+            mapping = intern_values(categories[name], interners[name])
+            if columns:
+                columns[name] = mapping[columns[name]]
+        if columns:
+            batches.append(pd.DataFrame(columns))
+    return finalize_batches(
+        batches, sum(result[1] for result in results), interners, sum(result[3] for result in results)
+    )
+
+# Function to parse an uploaded file in parallel by spooling it to a temporary file
+def parse_upload_parallel(uploaded_file, workers=None, chunk_size=CHUNK_SIZE, engine=DEFAULT_ENGINE, progress=None):
+    uploaded_file.seek(0)
+    with tempfile.NamedTemporaryFile(suffix='.log', delete=False) as spool:
+        shutil.copyfileobj(uploaded_file, spool, chunk_size)
+    try:
+        return parse_logs_parallel(spool.name, workers, chunk_size, engine, progress)
+    finally:
+        os.remove(spool.name)
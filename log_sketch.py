@@ -0,0 +1,255 @@
+"""Approximate summaries of huge logs in small, fixed memory.
+
+Each sketch is updated one chunk of rows at a time and can be merged with a
+sketch of other rows (another chunk, worker or file):
+
+- HyperLogLog estimates the number of distinct client IPs.
+- Space-Saving tracks the most frequent URLs and IPs with per-item error bounds.
+- A merging t-digest estimates response size percentiles.
+"""
+import math
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from log_parser import format_ipv4
+
+SKETCH_CHUNK_ROWS = 100_000
+HLL_PRECISION = 14
+HEAVY_HITTER_CAPACITY = 1000
+TDIGEST_COMPRESSION = 200
+SIZE_PERCENTILES = [50, 90, 95, 99]
+
+
+# Function to count the values of one chunk, most frequent first (ties keep first-seen
+# order). The chunk's own values are factorized, so a chunk of a categorical column
+# costs the same however many categories the whole column has.
+def count_chunk(column):
+    codes, uniques = pd.factorize(column)
+    values = np.asarray(uniques)
+    counts = pd.Series(np.bincount(codes[codes >= 0], minlength=len(values)),
+                       index=pd.Index(values, dtype=values.dtype, name=column.name), name='count')
+    return counts.sort_values(ascending=False, kind='stable')
+
+
+# Function to hash values to uint64 (deterministic, so sketches of different processes can be merged)
+def hash_values(values):
+    return pd.util.hash_array(np.asarray(values))
+
+
+# Function to count the significant bits of uint64 values
+def bit_length(values):
+    high = (values >> np.uint64(32)).astype(np.float64)
+    low = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    # 32-bit halves are exact in float64, so log2 gives their exact bit lengths
+    with np.errstate(divide='ignore'):
+        high_bits = np.where(high > 0, np.floor(np.log2(high)) + 33, 0)
+        low_bits = np.where(low > 0, np.floor(np.log2(low)) + 1, 0)
+    return np.where(high > 0, high_bits, low_bits).astype(np.int64)
+
+
+# Distinct count estimate with a relative standard error of 1.04 / sqrt(2 ** precision)
+class HyperLogLog:
+    def __init__(self, precision=HLL_PRECISION, registers=None):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8) if registers is None else registers
+
+    def add(self, values):
+        hashes = hash_values(values)
+        width = 64 - self.precision
+        buckets = (hashes >> np.uint64(width)).astype(np.int64)
+        # Rank of the first set bit in the remaining bits, counted from the left
+        ranks = width + 1 - bit_length(hashes & np.uint64((1 << width) - 1))
+        registers = self.registers.copy()
+        np.maximum.at(registers, buckets, ranks.astype(np.uint8))
+        return HyperLogLog(self.precision, registers)
+
+    def merge(self, other):
+        return HyperLogLog(self.precision, np.maximum(self.registers, other.registers))
+
+    @property
+    def relative_error(self):
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def estimate(self):
+        m = len(self.registers)
+        raw = 0.7213 / (1 + 1.079 / m) * m * m / np.ldexp(1.0, -self.registers.astype(np.int64)).sum()
+        empty = int((self.registers == 0).sum())
+        if raw <= 2.5 * m and empty:
+            # Linear counting is more accurate while many registers are still empty
+            return int(round(m * math.log(m / empty)))
+        return int(round(raw))
+
+
+# Most frequent items with bounded counters. For a tracked item the true count
+# lies in [count - error, count]; untracked items occur at most `floor` times.
+class SpaceSaving:
+    def __init__(self, capacity=HEAVY_HITTER_CAPACITY, counts=None, errors=None, floor=0):
+        self.capacity = capacity
+        self.counts = pd.Series(dtype=np.int64, name='count') if counts is None else counts
+        self.errors = pd.Series(dtype=np.int64, name='error') if errors is None else errors
+        self.floor = floor
+
+    @classmethod
+    def from_counts(cls, counts, capacity=HEAVY_HITTER_CAPACITY):
+        # Exact counts of one chunk (most frequent first), truncated to the capacity
+        floor = int(counts.iloc[capacity]) if len(counts) > capacity else 0
+        kept = counts.iloc[:capacity].astype(np.int64)
+        return cls(capacity, kept, pd.Series(0, index=kept.index, dtype=np.int64, name='error'), floor)
+
+    def add(self, column):
+        return self.merge(SpaceSaving.from_counts(count_chunk(column), self.capacity))
+
+    def merge(self, other):
+        # An item missing from one summary may still have occurred up to its floor times there
+        index = self.counts.index.union(other.counts.index, sort=False)
+        counts = self.counts.reindex(index, fill_value=self.floor) + other.counts.reindex(index, fill_value=other.floor)
+        errors = self.errors.reindex(index, fill_value=self.floor) + other.errors.reindex(index, fill_value=other.floor)
+        counts = counts.sort_values(ascending=False, kind='stable')
+        floor = self.floor + other.floor
+        if len(counts) > self.capacity:
+            floor = max(floor, int(counts.iloc[self.capacity]))
+            counts = counts.iloc[:self.capacity]
+        counts.name = 'count'
+        return SpaceSaving(self.capacity, counts, errors.reindex(counts.index).rename('error'), floor)
+
+    def top(self, n):
+        return self.counts.head(n)
+
+    def bounds(self, n):
+        counts = self.top(n)
+        return pd.DataFrame({
+            'count': counts,
+            'min_count': counts - self.errors.reindex(counts.index),
+        })
+
+
+# Quantile estimates from weighted centroids, most precise at the extremes
+class TDigest:
+    def __init__(self, compression=TDIGEST_COMPRESSION, means=None, weights=None, low=np.inf, high=-np.inf):
+        self.compression = compression
+        self.means = np.empty(0) if means is None else means
+        self.weights = np.empty(0) if weights is None else weights
+        self.low = low
+        self.high = high
+
+    @property
+    def total(self):
+        return float(self.weights.sum())
+
+    def _compress(self, means, weights, low, high):
+        order = np.argsort(means, kind='stable')
+        means, weights = means[order], weights[order]
+        if len(means):
+            # Centroids whose quantiles fall in the same unit of the k1 scale are merged
+            cumulative = np.cumsum(weights)
+            quantiles = (cumulative - weights / 2) / cumulative[-1]
+            scale = self.compression / (2 * np.pi) * np.arcsin(2 * quantiles - 1)
+            bins = np.floor(scale - scale[0]).astype(np.int64)
+            starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+            merged_weights = np.add.reduceat(weights, starts)
+            means = np.add.reduceat(means * weights, starts) / merged_weights
+            weights = merged_weights
+        return TDigest(self.compression, means, weights, low, high)
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            return self
+        return self._compress(
+            np.concatenate([self.means, values]), np.concatenate([self.weights, np.ones(len(values))]),
+            min(self.low, values.min()), max(self.high, values.max())
+        )
+
+    def merge(self, other):
+        return self._compress(
+            np.concatenate([self.means, other.means]), np.concatenate([self.weights, other.weights]),
+            min(self.low, other.low), max(self.high, other.high)
+        )
+
+    def quantile(self, q):
+        total = self.total
+        if not total:
+            return np.nan
+        centers = np.cumsum(self.weights) - self.weights / 2
+        return float(np.interp(q * total, np.r_[0, centers, total], np.r_[self.low, self.means, self.high]))
+
+    def rank_error(self, q):
+        # Weight of the centroid around q as a fraction of all values: the values
+        # merged into it are only known by their mean
+        centers = np.cumsum(self.weights) - self.weights / 2
+        nearest = int(np.abs(centers - q * self.total).argmin())
+        return float(self.weights[nearest] / self.total)
+
+
+# Sketches of one log, built chunk by chunk
+@dataclass
+class LogSketches:
+    total_requests: int
+    ips: HyperLogLog
+    top_urls: SpaceSaving
+    top_ips: SpaceSaving
+    sizes: TDigest
+
+    @classmethod
+    def empty(cls):
+        return cls(0, HyperLogLog(), SpaceSaving(), SpaceSaving(), TDigest())
+
+    def add(self, chunk):
+        return self.merge(LogSketches(
+            total_requests=len(chunk),
+            ips=HyperLogLog().add(chunk['ip']),
+            top_urls=SpaceSaving.from_counts(count_chunk(chunk['url'])),
+            top_ips=SpaceSaving.from_counts(count_chunk(chunk['ip'])),
+            sizes=TDigest().add(chunk['size']),
+        ))
+
+    def merge(self, other):
+        return LogSketches(
+            total_requests=self.total_requests + other.total_requests,
+            ips=self.ips.merge(other.ips),
+            top_urls=self.top_urls.merge(other.top_urls),
+            top_ips=self.top_ips.merge(other.top_ips),
+            sizes=self.sizes.merge(other.sizes),
+        )
+
+    @property
+    def unique_ips(self):
+        return self.ips.estimate()
+
+    def size_percentiles(self, percentiles=SIZE_PERCENTILES):
+        # The rank error is turned into a size range, which is wide where sizes jump
+        quantiles = np.asarray(percentiles) / 100
+        errors = np.array([self.sizes.rank_error(q) for q in quantiles])
+        return pd.DataFrame({
+            'percentile': percentiles,
+            'size': [self.sizes.quantile(q) for q in quantiles],
+            'rank_error': errors,
+            'min_size': [self.sizes.quantile(max(q, 0)) for q in quantiles - errors],
+            'max_size': [self.sizes.quantile(min(q, 1)) for q in quantiles + errors],
+        })
+
+
+# Function to sketch a log from an iterable of row chunks (DataFrames)
+def build_sketches(frames):
+    sketches = LogSketches.empty()
+    for chunk in frames:
+        sketches = sketches.add(chunk)
+    return sketches
+
+
+# Function to split a DataFrame into chunks for build_sketches
+def iter_chunks(df, chunk_rows=SKETCH_CHUNK_ROWS):
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+# Function to build the approximate tables of a log as plain DataFrames (IPs dotted)
+def sketch_tables(sketches, top_n=10):
+    top_ips = sketches.top_ips.bounds(top_n)
+    return {
+        'approx_top_urls': sketches.top_urls.bounds(top_n).rename_axis('url').reset_index(),
+        'approx_top_ips': top_ips.assign(ip=format_ipv4(top_ips.index))[['ip', 'count', 'min_count']].reset_index(drop=True),
+        'size_percentiles': sketches.size_percentiles(),
+    }
@@ -0,0 +1,356 @@
+"""Out-of-core storage of parsed logs in an embedded database file.
+
+Logs that do not fit in memory are parsed batch by batch and appended to a
+DuckDB file (or SQLite when duckdb is not installed). The dashboard views are
+answered by aggregate queries, so only the small result tables reach pandas.
+"""
+import importlib.util
+import io
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+from log_analysis import STATUS_CLASS_BY_HUNDREDS, STATUS_CLASSES, classify_status
+from log_parser import (
+    CATEGORY_COLUMNS, CHUNK_SIZE, DEFAULT_ENGINE, LOG_COLUMNS, NS_PER_HOUR, NS_PER_SECOND, PARSE_ENGINES,
+    iter_line_batches, new_interners, timestamp_columns,
+)
+
+HAS_DUCKDB = importlib.util.find_spec("duckdb") is not None
+STORE_BACKENDS = ['duckdb', 'sqlite']
+DEFAULT_BACKEND = 'duckdb' if HAS_DUCKDB else 'sqlite'
+
+# Rows are stored as parsed, with the UTC offset kept beside the epoch timestamp
+STORE_COLUMNS = ['ip', 'datetime', 'tz_offset', 'method', 'url', 'status', 'size', 'referrer', 'user_agent']
+STORE_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS sources (
+        key TEXT PRIMARY KEY,
+        name TEXT,
+        rows BIGINT,
+        unparsed_lines BIGINT,
+        ingested_at TEXT
+    )""",
+    """CREATE TABLE IF NOT EXISTS requests (
+        ip BIGINT,
+        datetime BIGINT,
+        tz_offset SMALLINT,
+        method TEXT,
+        url TEXT,
+        status INTEGER,
+        size BIGINT,
+        referrer TEXT,
+        user_agent TEXT
+    )""",
+    # Bumped by every clear, so that the store key never repeats
+    """CREATE TABLE IF NOT EXISTS store_info (
+        name TEXT PRIMARY KEY,
+        value BIGINT
+    )""",
+    """INSERT INTO store_info SELECT 'generation', 0
+        WHERE NOT EXISTS (SELECT 1 FROM store_info WHERE name = 'generation')""",
+]
+
+
+# Function to pick the default store file for a backend inside a directory
+def default_store_path(directory, backend=DEFAULT_BACKEND):
+    return os.path.join(directory, "logs.duckdb" if backend == 'duckdb' else "logs.sqlite")
+
+
+# Function to build a SQL condition matching user agents that contain any of the bot patterns
+def bot_match_sql(patterns):
+    condition = ' OR '.join(['instr(lower(user_agent), ?) > 0'] * len(patterns)) or 'FALSE'
+    return f"({condition})", [pattern.lower() for pattern in patterns]
+
+
+# Function to translate a LogFilter into a WHERE clause and its parameters
+def filter_sql(filters):
+    conditions, params = [], []
+    if filters is None:
+        return '', params
+    if filters.start_ns is not None:
+        conditions.append("datetime >= ?")
+        params.append(filters.start_ns)
+    if filters.end_ns is not None:
+        conditions.append("datetime < ?")
+        params.append(filters.end_ns)
+    if filters.status_classes:
+        # Status codes are three digits, so each class is a set of hundreds ranges
+        codes = [STATUS_CLASSES.index(name) for name in filters.status_classes]
+        hundreds = [hundred for hundred, code in enumerate(STATUS_CLASS_BY_HUNDREDS) if code in codes]
+        conditions.append('(' + ' OR '.join(['(status >= ? AND status < ?)'] * len(hundreds)) + ')')
+        for hundred in hundreds:
+            params += [hundred * 100, hundred * 100 + 100]
+    if filters.methods:
+        conditions.append(f"method IN ({', '.join('?' * len(filters.methods))})")
+        params += list(filters.methods)
+    if filters.is_bot is not None:
+        condition, pattern_params = bot_match_sql(filters.bot_patterns)
+        conditions.append(condition if filters.is_bot else f"NOT {condition}")
+        params += pattern_params
+    if filters.url_prefix:
+        conditions.append("substr(url, 1, ?) = ?")
+        params += [len(filters.url_prefix), filters.url_prefix]
+    return (" WHERE " + " AND ".join(conditions) if conditions else ''), params
+
+
+# Parsed logs appended to one database file, shared by every session of the server
+class LogStore:
+    def __init__(self, path, backend=DEFAULT_BACKEND):
+        self.path = path
+        self.backend = backend
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if backend == 'duckdb':
+            import duckdb
+            self.connection = duckdb.connect(path)
+        else:
+            # Transactions are managed explicitly, see ingest()
+            self.connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        # One connection is shared by the Streamlit session threads
+        self.lock = threading.RLock()
+        for statement in STORE_SCHEMA:
+            self.connection.execute(statement)
+
+    def query(self, sql, params=()):
+        with self.lock:
+            return self.connection.execute(sql, params).fetchall()
+
+    def has_source(self, key):
+        return bool(self.query("SELECT COUNT(*) FROM sources WHERE key = ?", [key])[0][0])
+
+    def sources(self):
+        rows = self.query("SELECT key, name, rows, unparsed_lines, ingested_at FROM sources ORDER BY ingested_at")
+        return pd.DataFrame(rows, columns=['key', 'name', 'rows', 'unparsed_lines', 'ingested_at'])
+
+    @property
+    def key(self):
+        # Identifies the data stored so far, for caches keyed by dataset. Logs are
+        # only ever added between clears, so the clear generation and the number of
+        # logs and rows tell every state apart.
+        generation, count, rows = self.query(
+            "SELECT (SELECT value FROM store_info WHERE name = 'generation'), COUNT(*), COALESCE(SUM(rows), 0) "
+            "FROM sources"
+        )[0]
+        return f"store:{os.path.abspath(self.path)}:{generation}:{count}:{rows}"
+
+    @property
+    def unparsed_lines(self):
+        return int(self.query("SELECT COALESCE(SUM(unparsed_lines), 0) FROM sources")[0][0])
+
+    def _append(self, frame):
+        if self.backend == 'duckdb':
+            self.connection.register('parsed_batch', frame)
+            try:
+                self.connection.execute("INSERT INTO requests SELECT * FROM parsed_batch")
+            finally:
+                self.connection.unregister('parsed_batch')
+        else:
+            placeholders = ', '.join('?' * len(STORE_COLUMNS))
+            columns = [frame[name].tolist() for name in STORE_COLUMNS]
+            self.connection.executemany(f"INSERT INTO requests VALUES ({placeholders})", zip(*columns))
+
+    def ingest(self, log_content, key, name, engine=DEFAULT_ENGINE, chunk_size=CHUNK_SIZE, progress=None):
+        """Parse a log batch by batch into the store, unless its key is already stored.
+
+        Returns the number of rows added. A failed ingest is rolled back, so a
+        log is either stored completely or not at all.
+        """
+        if isinstance(log_content, os.PathLike):
+            with open(log_content, 'rb') as stream:
+                return self.ingest(stream, key, name, engine, chunk_size, progress)
+        if isinstance(log_content, str):
+            log_content = log_content.encode('utf-8')
+        if isinstance(log_content, bytes):
+            log_content = io.BytesIO(log_content)
+
+        parse_lines = PARSE_ENGINES[engine]
+        rows = unparsed_lines = 0
+        with self.lock:
+            if self.has_source(key):
+                return 0
+            self.connection.execute("BEGIN TRANSACTION")
+            try:
+                for lines in iter_line_batches(log_content, chunk_size):
+                    # Fresh interning tables per batch keep memory bounded by the batch size
+                    interners = new_interners()
+                    batch, unparsed, _ = parse_lines(lines, interners)
+                    unparsed_lines += unparsed
+                    if batch.empty:
+                        continue
+                    for column in CATEGORY_COLUMNS:
+                        values = np.array(list(interners[column]), dtype=object)
+                        batch[column] = values[batch[column].to_numpy()]
+                    batch['ip'] = batch['ip'].astype(np.int64)
+                    self._append(batch[STORE_COLUMNS])
+                    rows += len(batch)
+                    if progress is not None:
+                        progress(rows)
+                self.connection.execute(
+                    "INSERT INTO sources VALUES (?, ?, ?, ?, ?)",
+                    [key, name, rows, unparsed_lines, datetime.now().isoformat(timespec='seconds')]
+                )
+                self.connection.execute("COMMIT")
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+        return rows
+
+    def clear(self):
+        with self.lock:
+            self.connection.execute("BEGIN TRANSACTION")
+            try:
+                self.connection.execute("DELETE FROM requests")
+                self.connection.execute("DELETE FROM sources")
+                self.connection.execute("UPDATE store_info SET value = value + 1 WHERE name = 'generation'")
+                self.connection.execute("COMMIT")
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+
+    def utc_offset(self):
+        # The UTC offset (in minutes) shared by all stored rows, or None when they differ
+        low, high = self.query("SELECT MIN(tz_offset), MAX(tz_offset) FROM requests")[0]
+        return int(low) if low == high and low is not None else None
+
+    def time_bounds(self):
+        first, last = self.query("SELECT MIN(datetime), MAX(datetime) FROM requests")[0]
+        # Shown in the logs' own UTC offset when they all share one, as the parser does
+        tz = timezone(timedelta(minutes=self.utc_offset() or 0))
+        return pd.Timestamp(first, tz='UTC').tz_convert(tz), pd.Timestamp(last, tz='UTC').tz_convert(tz)
+
+    def head(self, n=10, filters=None):
+        where, params = filter_sql(filters)
+        rows = self.query(f"SELECT {', '.join(STORE_COLUMNS)} FROM requests{where} LIMIT ?", params + [n])
+        return rows_frame(rows, self.utc_offset())
+
+    def iter_frames(self, chunk_rows, filters=None):
+        # Stream the (filtered) rows in insertion order, e.g. for an export. Every
+        # chunk is shown in the same time zone, picked from all stored rows.
+        where, params = filter_sql(filters)
+        utc_offset = self.utc_offset()
+        with self.lock:
+            cursor = self.connection.execute(f"SELECT {', '.join(STORE_COLUMNS)} FROM requests{where}", params)
+            while True:
+                rows = cursor.fetchmany(chunk_rows)
+                if not rows:
+                    break
+                yield rows_frame(rows, utc_offset)
+
+    def aggregates(self, filters=None):
+        return StoreAggregates(self, filters)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+# Function to turn stored rows back into the parsed DataFrame layout, with their
+# timestamps in the given UTC offset (the store's, see LogStore.utc_offset), or in UTC if it is None
+def rows_frame(rows, utc_offset=None):
+    df = pd.DataFrame.from_records(rows, columns=STORE_COLUMNS)
+    df['ip'] = df['ip'].astype(np.uint32)
+    df['status'] = df['status'].astype(np.uint16)
+    df['size'] = df['size'].astype(np.int64)
+    df.pop('tz_offset')
+    df['datetime'], df['hour'] = timestamp_columns(
+        df['datetime'].to_numpy(dtype=np.int64), np.full(len(df), utc_offset or 0, dtype=np.int16)
+    )
+    return df[LOG_COLUMNS + ['hour']]
+
+
+# Summaries of the (filtered) rows of a LogStore with the interface of
+# LogAggregates, answered by SQL. Query results are memoized, so a
+# StoreAggregates is only valid for the store contents it was created for
+# (see LogStore.key).
+class StoreAggregates:
+    def __init__(self, store, filters=None):
+        self.store = store
+        self.where, self.params = filter_sql(filters)
+        total, success = self.query(
+            "SELECT COUNT(*), COALESCE(SUM(CASE WHEN status < 400 THEN 1 ELSE 0 END), 0) FROM requests{where}"
+        )[0]
+        self.total_requests = int(total)
+        self.success_count = int(success)
+        self._top_counts = {}
+        self._bot_counts = {}
+
+    @cached_property
+    def unique_ips(self):
+        # An exact distinct count needs a hash table of all addresses, so it is only run when shown
+        return int(self.query("SELECT COUNT(DISTINCT ip) FROM requests{where}")[0][0])
+
+    @property
+    def success_rate(self):
+        return self.success_count / self.total_requests * 100 if self.total_requests else 0.0
+
+    def query(self, sql, params=()):
+        # Parameters of the filter follow those of the select list
+        return self.store.query(sql.format(where=self.where), list(params) + self.params)
+
+    def _counts(self, column, limit=None):
+        # Ties keep first-stored order, like count_values on the in-memory frame
+        sql = f"SELECT {column}, COUNT(*) AS count FROM requests{{where}} GROUP BY {column} ORDER BY count DESC, MIN(rowid)"
+        if limit is None:
+            rows = self.query(sql)
+        else:
+            # The LIMIT placeholder comes after the filter's
+            rows = self.store.query(sql.format(where=self.where) + " LIMIT ?", self.params + [limit])
+        index = pd.Index([row[0] for row in rows], name=column)
+        return pd.Series([row[1] for row in rows], index=index, name='count', dtype=np.int64)
+
+    def _top(self, column, n):
+        if (column, n) not in self._top_counts:
+            self._top_counts[(column, n)] = self._counts(column, n)
+        return self._top_counts[(column, n)].copy()
+
+    def top_urls(self, n):
+        return self._top('url', n)
+
+    def top_ips(self, n):
+        return self._top('ip', n)
+
+    @cached_property
+    def method_counts(self):
+        return self._counts('method')
+
+    @cached_property
+    def status_counts(self):
+        rows = self.query("SELECT status, COUNT(*) FROM requests{where} GROUP BY status ORDER BY status")
+        index = pd.Index([row[0] for row in rows], name='status')
+        return pd.Series([row[1] for row in rows], index=index, name='count', dtype=np.int64)
+
+    def status_class_counts(self):
+        classes = classify_status(self.status_counts.index)
+        counts = self.status_counts.groupby(classes, observed=True).sum()
+        return counts.sort_values(ascending=False, kind='stable')
+
+    @cached_property
+    def hourly_counts(self):
+        # Hours are floored in local time when all stored rows share one UTC offset,
+        # and in UTC otherwise, as the parser does (filters do not change the time zone)
+        offset_minutes = self.store.utc_offset() or 0
+        offset_ns = offset_minutes * 60 * NS_PER_SECOND
+        rows = self.query(
+            "SELECT datetime + ? - (datetime + ?) % ? - ? AS hour, COUNT(*) FROM requests{where} GROUP BY 1 ORDER BY 1",
+            [offset_ns, offset_ns, NS_PER_HOUR, offset_ns]
+        )
+        hours = np.array([row[0] for row in rows], dtype=np.int64).view('datetime64[ns]')
+        index = pd.DatetimeIndex(hours, name='hour').tz_localize('UTC').tz_convert(
+            timezone(timedelta(minutes=offset_minutes))
+        )
+        return pd.Series([row[1] for row in rows], index=index, name='count', dtype=np.int64)
+
+    def bot_counts(self, classifier):
+        # The classifier's substrings are matched inside the database
+        if classifier.patterns not in self._bot_counts:
+            match, params = bot_match_sql(classifier.patterns)
+            bots, total = self.query(
+                f"SELECT COALESCE(SUM(CASE WHEN {match} THEN 1 ELSE 0 END), 0), COUNT(*) FROM requests{{where}}", params
+            )[0]
+            counts = pd.Series([total - bots, bots], index=[False, True], name='count', dtype=np.int64)
+            self._bot_counts[classifier.patterns] = counts.rename_axis('is_bot')[counts > 0]
+        return self._bot_counts[classifier.patterns]
@@ -0,0 +1,351 @@
+"""Incremental ingest of an access log that keeps growing on disk.
+
+A LogTail remembers the inode and byte offset of the file it follows, so each
+refresh parses only the lines appended since the last one and folds their
+summaries into the running aggregates. The rows are kept in time order in
+preallocated column buffers, so new rows are merged in place instead of
+rebuilding every row, and the time index only redoes the rows that moved.
+"""
+import itertools
+import os
+from datetime import timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+from log_analysis import LogAggregates
+from log_index import LogIndex
+from log_parser import (CATEGORY_COLUMNS, CHUNK_SIZE, DEFAULT_ENGINE, LOG_COLUMNS, NS_PER_HOUR, NS_PER_SECOND,
+                        finalize_batches, intern_values, parse_line_batches)
+from log_sketch import build_sketches, iter_chunks
+
+INITIAL_CAPACITY = 1 << 16
+# Columns whose count tables are ranked by count (the rest are sorted by value)
+RANKED_COLUMNS = ['url', 'ip', 'method', 'user_agent']
+
+
+# Function to add a bincount of small non-negative integers to running totals
+def add_bincount(totals, values):
+    counts = np.bincount(values, minlength=len(totals))
+    counts[:len(totals)] += totals
+    return counts
+
+
+# Function to return the dtype pandas stores the codes of this many categories in
+def code_dtype(categories):
+    return next(dtype for dtype in (np.int8, np.int16, np.int32, np.int64) if categories < np.iinfo(dtype).max)
+
+
+# Function to add the counts of some values to counts sorted by value, inserting
+# the values not seen before by binary search instead of realigning the indexes
+def add_sorted_counts(counts, values):
+    values, added = np.unique(values, return_counts=True)
+    keys, totals = counts.index.to_numpy().astype(values.dtype, copy=False), counts.to_numpy().copy()
+    at = np.searchsorted(keys, values)
+    found = keys[np.minimum(at, len(keys) - 1)] == values if len(keys) else np.zeros(len(values), dtype=bool)
+    totals[at[found]] += added[found]
+    keys = np.insert(keys, at[~found], values[~found])
+    totals = np.insert(totals, at[~found], added[~found])
+    return pd.Series(totals, index=pd.Index(keys, name=counts.index.name), name=counts.name)
+
+
+# Counts of a coded column (codes in first-seen order), kept ranked by count with
+# ties in first-seen order. Adding codes only re-sorts the codes they touch and
+# merges them into the ranking by binary search.
+class RankedCounts:
+    def __init__(self):
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.order = np.zeros(0, dtype=np.int64)
+
+    def add(self, codes):
+        touched, added = np.unique(codes, return_counts=True)
+        if not len(touched):
+            return
+        if touched[-1] >= len(self.counts):
+            self.counts = np.concatenate([self.counts, np.zeros(touched[-1] + 1 - len(self.counts), dtype=np.int64)])
+        moved = np.zeros(len(self.counts), dtype=bool)
+        moved[touched] = True
+        kept = self.order[~moved[self.order]]
+        self.counts[touched] += added
+        touched = touched[np.lexsort((touched, -self.counts[touched]))]
+        # Codes are below len(counts), so one integer orders by count, then first seen
+        def sort_key(codes):
+            return -self.counts[codes] * len(self.counts) + codes
+        self.order = np.insert(kept, np.searchsorted(sort_key(kept), sort_key(touched)), touched)
+
+    def series(self, values, name):
+        return pd.Series(self.counts[self.order], index=pd.Index(values[self.order], dtype=values.dtype, name=name), name='count')
+
+
+# Follows one log file across appends, rotation and truncation
+class LogTail:
+    def __init__(self, path, engine=DEFAULT_ENGINE, chunk_size=CHUNK_SIZE):
+        self.path = path
+        self.engine = engine
+        self.chunk_size = chunk_size
+        self.stream = None
+        self.inode = None
+        self.offset = 0
+        self.remainder = b''
+        # Shared interning tables keep category codes stable across refreshes
+        self.interners = None
+        # Category values by code (a buffer and its used length), and the dtypes of the frame's category columns
+        self.categories = {}
+        self.category_dtypes = {}
+        # Running counts: ranked counts per category code (or interned IP), and per status code
+        self.counts = {}
+        self.ip_codes = {}
+        self.status_totals = np.zeros(0, dtype=np.int64)
+        self.unparsed_lines = 0
+        self.rejected_lines = 0
+        self.aggregates = None
+        self.sketches = None
+        self.rotations = 0
+        self.truncations = 0
+        # Time-ordered rows: raw columns (epoch ns, packed IPs, category codes) in
+        # buffers with spare capacity, of which the first `rows` entries are used
+        self.rows = 0
+        self.columns = {}
+        # The single UTC offset of all rows so far, or None once offsets are mixed
+        self.utc_offset = None
+        self._frame = None
+        self._index = None
+        # First row position changed since the index was last updated
+        self._changed_from = None
+
+    @property
+    def key(self):
+        # Identifies the data ingested so far, for caches keyed by dataset
+        return f"tail:{self.path}:{self.rotations}:{self.truncations}:{self.offset}"
+
+    def _open(self):
+        self.stream = open(self.path, 'rb')
+        self.inode = os.fstat(self.stream.fileno()).st_ino
+        self.offset = 0
+        self.remainder = b''
+
+    def _read_new_lines(self, final=False):
+        # Yield batches of complete lines; a trailing partial line is held
+        # back until the writer finishes it (or the file is rotated away)
+        while True:
+            chunk = self.stream.read(self.chunk_size)
+            if not chunk:
+                break
+            self.offset += len(chunk)
+            data = self.remainder + chunk
+            cut = data.rfind(b'\n')
+            if cut < 0:
+                self.remainder = data
+                continue
+            self.remainder = data[cut + 1:]
+            yield data[:cut].decode('utf-8', errors='replace').split('\n')
+        if final and self.remainder:
+            yield [self.remainder.decode('utf-8', errors='replace')]
+            self.remainder = b''
+
+    def _ingest(self, line_batches):
+        batches, unparsed, self.interners, rejected = parse_line_batches(line_batches, self.engine, self.interners)
+        self.unparsed_lines += unparsed
+        self.rejected_lines += rejected
+        if not batches:
+            return 0
+        batch = pd.concat(batches, ignore_index=True) if len(batches) > 1 else batches[0]
+        single_offset = self.utc_offset is not None
+        hours = self._append(batch)
+        self._summarize(batch, hours, recount_hours=single_offset and self.utc_offset is None)
+        if self.sketches is not None:
+            new_rows = self._new_rows(batch, hours)
+            for chunk in iter_chunks(new_rows):
+                self.sketches = self.sketches.add(chunk)
+        return len(batch)
+
+    def _summarize(self, batch, hours, recount_hours=False):
+        # Fold the new rows into the running aggregates. The count tables are kept
+        # by code, so a refresh only counts the new rows and re-ranks the values they touched.
+        for name in RANKED_COLUMNS:
+            codes = intern_values(batch['ip'], self.ip_codes) if name == 'ip' else batch[name].to_numpy()
+            self.counts.setdefault(name, RankedCounts()).add(codes)
+        status = batch['status'].to_numpy()
+        sizes = batch['size'].to_numpy().astype(self.columns['size'].dtype, copy=False)
+        self.status_totals = add_bincount(self.status_totals, status)
+        new_hours = self._datetimes(hours).value_counts(sort=False)
+        previous = self.aggregates
+        if previous is None or recount_hours:
+            # After offsets start to differ the stored hours are in UTC, so they are counted again (once)
+            hourly_counts = self.frame()['hour'].value_counts(sort=False).sort_index()
+        else:
+            hourly_counts = previous.hourly_counts.add(new_hours, fill_value=0).astype(np.int64).sort_index()
+
+        status_counts = pd.Series(self.status_totals, name='count').rename_axis('status')
+        self.aggregates = LogAggregates(
+            total_requests=(previous.total_requests if previous else 0) + len(batch),
+            success_count=(previous.success_count if previous else 0) + int((status < 400).sum()),
+            status_counts=status_counts[status_counts > 0],
+            hourly_counts=hourly_counts.rename_axis('hour'),
+            size_counts=add_sorted_counts(previous.size_counts if previous else
+                                          pd.Series(0, index=pd.Index(sizes[:0], name='size'), name='count'), sizes),
+            **{f'{name}_counts': self.counts[name].series(self._category_values(name), name)
+               for name in RANKED_COLUMNS},
+        )
+
+    def _new_rows(self, batch, hours):
+        # The new rows as a parsed log, with their categories recoded onto the
+        # values they use (in first-seen order) instead of every value seen so far
+        batch = batch.copy(deep=False)
+        interners = {}
+        for name in CATEGORY_COLUMNS:
+            used, batch[name] = np.unique(batch[name].to_numpy(), return_inverse=True)
+            interners[name] = dict.fromkeys(self._category_values(name)[used].tolist())
+        new_rows = finalize_batches([batch], 0, interners)
+        new_rows['hour'] = self._datetimes(hours)
+        return new_rows
+
+    def _category_values(self, name):
+        # Values by code (packed IPs, or category strings), in a buffer extended with the
+        # values the interning table gained (read from its end, which dicts iterate in reverse)
+        dtype, interner = (np.uint32, self.ip_codes) if name == 'ip' else (object, self.interners[name])
+        values, count = self.categories.get(name, (np.empty(INITIAL_CAPACITY, dtype=dtype), 0))
+        if count < len(interner):
+            added = list(itertools.islice(reversed(interner), len(interner) - count))[::-1]
+            if len(interner) > len(values):
+                grown = np.empty(max(len(interner), 2 * len(values)), dtype=dtype)
+                grown[:count] = values[:count]
+                values = grown
+            values[count:len(interner)] = added
+            count = len(interner)
+            self.categories[name] = values, count
+        return values[:count]
+
+    def _reserve(self, rows, batch):
+        if not self.columns:
+            dtypes = {name: batch[name].dtype for name in LOG_COLUMNS}
+            dtypes.update(dict.fromkeys(CATEGORY_COLUMNS, np.int8), size=np.uint32, hour=np.int64)
+            self.columns = {name: np.empty(max(INITIAL_CAPACITY, rows), dtype=dtype) for name, dtype in dtypes.items()}
+        # Sizes are stored as uint32 like a parsed log's, unless a size does not fit
+        if self.columns['size'].dtype != np.int64 and batch['size'].max() >= 2**32:
+            self.columns['size'] = self.columns['size'].astype(np.int64)
+        # Category codes are kept in the dtype pandas uses for their number of
+        # categories, so that building a frame does not copy them
+        for name in CATEGORY_COLUMNS:
+            dtype = code_dtype(len(self.interners[name]))
+            if self.columns[name].dtype.itemsize < np.dtype(dtype).itemsize:
+                self.columns[name] = self.columns[name].astype(dtype)
+        capacity = len(self.columns['datetime'])
+        if rows > capacity:
+            # Grow geometrically, so each row is copied a constant number of times on average
+            capacity = max(rows, 2 * capacity)
+            for name, buffer in self.columns.items():
+                grown = np.empty(capacity, dtype=buffer.dtype)
+                grown[:self.rows] = buffer[:self.rows]
+                self.columns[name] = grown
+
+    def _append(self, batch):
+        end = self.rows + len(batch)
+        self._reserve(end, batch)
+        times = batch['datetime'].to_numpy()
+        offsets = batch['tz_offset'].to_numpy()
+
+        # The hour column floors in local time while all rows share one UTC
+        # offset, and in UTC once they do not (as finalize_batches does)
+        if self.rows == 0 and (offsets == offsets[0]).all():
+            self.utc_offset = int(offsets[0])
+        elif self.utc_offset is not None and (offsets != self.utc_offset).any():
+            self.utc_offset = None
+            stored = self.columns['datetime'][:self.rows]
+            self.columns['hour'][:self.rows] = stored - stored % NS_PER_HOUR
+        offset_ns = (self.utc_offset or 0) * 60 * NS_PER_SECOND
+        new_columns = {name: batch[name].to_numpy() for name in LOG_COLUMNS}
+        new_columns['hour'] = times + offset_ns - (times + offset_ns) % NS_PER_HOUR - offset_ns
+
+        # Logs are written nearly in time order, so only the stored rows later
+        # than the earliest new row are merged with the new rows
+        start = int(np.searchsorted(self.columns['datetime'][:self.rows], times.min(), side='right'))
+        order = np.argsort(np.concatenate([self.columns['datetime'][start:self.rows], times]), kind='stable')
+        for name, buffer in self.columns.items():
+            buffer[start:end] = np.concatenate([buffer[start:self.rows], new_columns[name]])[order]
+        self.rows = end
+        self._frame = None
+        self._changed_from = start if self._changed_from is None else min(self._changed_from, start)
+        return new_columns['hour']
+
+    def _category_dtype(self, name):
+        # Validating the categories of a new dtype hashes them all, so a dtype is
+        # only rebuilt once its column has new values
+        dtype = self.category_dtypes.get(name)
+        if dtype is None or len(dtype.categories) != len(self.interners[name]):
+            dtype = self.category_dtypes[name] = pd.CategoricalDtype(pd.Index(self._category_values(name), dtype=object))
+        return dtype
+
+    def _datetimes(self, epoch_ns):
+        # Timestamps in the time zone of all rows: their shared UTC offset, or UTC once offsets are mixed
+        # (epoch nanoseconds are read as UTC instants, without copying them)
+        tz = timezone.utc if self.utc_offset is None else timezone(timedelta(minutes=self.utc_offset))
+        return pd.Series(epoch_ns, dtype=pd.DatetimeTZDtype('ns', tz), copy=False)
+
+    # Parse the lines appended since the last refresh, returning how many rows were added
+    def refresh(self):
+        added = 0
+        if self.stream is None:
+            self._open()
+        else:
+            stat = os.stat(self.path)
+            if stat.st_ino != self.inode:
+                # Rotated: finish the old file through the open handle, then follow the new one
+                added += self._ingest(self._read_new_lines(final=True))
+                self.stream.close()
+                self.rotations += 1
+                self._open()
+            elif stat.st_size < self.offset:
+                # Truncated in place (e.g. copytruncate): start over from the beginning
+                self.stream.seek(0)
+                self.offset = 0
+                self.remainder = b''
+                self.truncations += 1
+        added += self._ingest(self._read_new_lines())
+        return added
+
+    def frame(self):
+        # A frame over the used part of the buffers, sorted by time. Only the
+        # datetime and category columns are converted; the other columns are views,
+        # so a frame is only valid until the next refresh.
+        if self._frame is None and self.rows:
+            columns = {}
+            for name in LOG_COLUMNS + ['hour']:
+                values = self.columns[name][:self.rows]
+                if name in CATEGORY_COLUMNS:
+                    # The codes come from the interning tables, so they are not checked again
+                    columns[name] = pd.Series(pd.Categorical.from_codes(values, dtype=self._category_dtype(name),
+                                                                        validate=False))
+                elif name in ('datetime', 'hour'):
+                    columns[name] = self._datetimes(values)
+                else:
+                    columns[name] = pd.Series(values, copy=False)
+            self._frame = pd.DataFrame(columns, copy=False)
+            self._frame.attrs['unparsed_lines'] = self.unparsed_lines
+            self._frame.attrs['rejected_lines'] = self.rejected_lines
+        return self._frame
+
+    def index(self):
+        # The rows are already in time order, so the index is only extended
+        # from the first row that moved since the last refresh
+        df = self.frame()
+        if df is None:
+            return None
+        times = self.columns['datetime'][:self.rows]
+        if self._index is None:
+            self._index = LogIndex(df, times)
+        elif self._changed_from is not None:
+            self._index.extend(df, times, self._changed_from)
+        self._changed_from = None
+        return self._index
+
+    def load_sketches(self):
+        # Sketched once over the rows so far, then kept up to date with each refresh
+        if self.sketches is None:
+            self.sketches = build_sketches(iter_chunks(self.frame()))
+        return self.sketches
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
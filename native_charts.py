@@ -0,0 +1,93 @@
+"""Vega-Lite (Altair) versions of the dashboard charts.
+
+The functions mirror those in charts.py but return chart specs that the
+browser renders, so the server only sends the small aggregate tables.
+"""
+import altair as alt
+import pandas as pd
+
+from charts import STATUS_CLASS_COLORS
+
+
+# Function to turn a count Series into a two-column table for Altair
+def count_table(counts, label):
+    return pd.DataFrame({label: [str(value) for value in counts.index], 'count': counts.to_numpy()})
+
+
+# Horizontal bar chart of the most accessed URLs
+def top_urls_chart(top_urls):
+    return alt.Chart(count_table(top_urls, 'url'), title=f'Top {len(top_urls)} URLs Accessed').mark_bar(
+        color='skyblue'
+    ).encode(
+        x=alt.X('count:Q', title='Number of Requests'),
+        y=alt.Y('url:N', title='URL', sort='-x'),
+        tooltip=['url', 'count'],
+    )
+
+
+# Horizontal bar chart of the busiest client IPs (index already formatted as dotted strings)
+def top_ips_chart(top_ips):
+    return alt.Chart(count_table(top_ips, 'ip'), title=f'Top {len(top_ips)} IP Addresses by Number of Requests').mark_bar(
+        color='green'
+    ).encode(
+        x=alt.X('count:Q', title='Number of Requests'),
+        y=alt.Y('ip:N', title='IP Address', sort='-x'),
+        tooltip=['ip', 'count'],
+    )
+
+
+# Bar chart of requests per status code
+def status_codes_chart(status_counts):
+    return alt.Chart(count_table(status_counts, 'status'), title='HTTP Status Code Distribution').mark_bar(
+        color='orange'
+    ).encode(
+        x=alt.X('status:O', title='Status Code', axis=alt.Axis(labelAngle=0)),
+        y=alt.Y('count:Q', title='Count'),
+        tooltip=['status', 'count'],
+    )
+
+
+# Pie chart of requests per status class
+def status_classes_chart(status_class_counts):
+    classes = list(status_class_counts.index)
+    return alt.Chart(count_table(status_class_counts, 'status_class'), title='HTTP Status Code Types').mark_arc().encode(
+        theta='count:Q',
+        color=alt.Color('status_class:N', title='Status Class', scale=alt.Scale(
+            domain=classes, range=[STATUS_CLASS_COLORS[name] for name in classes]
+        )),
+        tooltip=['status_class', 'count'],
+    )
+
+
+# Line chart of requests per hour (in the logs' own UTC offset)
+def requests_over_time_chart(requests_per_hour):
+    table = pd.DataFrame({'hour': requests_per_hour.index.tz_localize(None), 'count': requests_per_hour.to_numpy()})
+    return alt.Chart(table, title='Number of Requests Over Time').mark_line(point=True, color='purple').encode(
+        x=alt.X('hour:T', title='Time'),
+        y=alt.Y('count:Q', title='Number of Requests'),
+        tooltip=[alt.Tooltip('hour:T', format='%Y-%m-%d %H:%M'), 'count'],
+    )
+
+
+# Pie chart of bot versus human requests (index: is_bot flags)
+def bot_traffic_chart(bot_counts):
+    table = pd.DataFrame({
+        'traffic': ['Bot' if is_bot else 'Human' for is_bot in bot_counts.index],
+        'count': bot_counts.to_numpy(),
+    })
+    return alt.Chart(table, title='Bot vs Human Traffic').mark_arc().encode(
+        theta='count:Q',
+        color=alt.Color('traffic:N', title='Traffic', scale=alt.Scale(
+            domain=['Human', 'Bot'], range=['lightblue', 'lightgreen']
+        )),
+        tooltip=['traffic', 'count'],
+    )
+
+
+# Pie chart of requests per HTTP method
+def request_methods_chart(method_counts):
+    return alt.Chart(count_table(method_counts, 'method'), title='HTTP Request Methods').mark_arc().encode(
+        theta='count:Q',
+        color=alt.Color('method:N', title='Method', scale=alt.Scale(scheme='pastel1')),
+        tooltip=['method', 'count'],
+    )
@@ -0,0 +1,232 @@
+"""Lightweight instrumentation of the log pipeline.
+
+Each stage (reading, parsing, derived columns, aggregation, rendering, export)
+is timed with perf_counter, and its peak memory growth is sampled from
+/proc/self/statm by a background thread. Counters record cache hits and
+misses and parsed versus rejected lines. The metrics can be exported as JSON
+or in the Prometheus text format.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass
+
+import pandas as pd
+
+SAMPLE_INTERVAL = 0.005
+METRICS_PREFIX = 'weblog'
+
+
+# Function to read the resident set size of this process in bytes (None where /proc is missing)
+def current_rss():
+    try:
+        with open('/proc/self/statm') as handle:
+            return int(handle.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+# Samples the resident set size in a background thread to find the peak of a stage
+class RssSampler:
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.baseline = current_rss()
+        self.peak = self.baseline
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def _sample(self):
+        rss = current_rss()
+        if rss is not None and rss > self.peak:
+            self.peak = rss
+
+    def __enter__(self):
+        if self.baseline is not None:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.baseline is not None:
+            self._stop.set()
+            self._thread.join()
+            self._sample()
+
+    @property
+    def peak_delta(self):
+        return None if self.baseline is None else self.peak - self.baseline
+
+
+# One run of a stage. The number of rows can be set inside the with block,
+# once it is known (e.g. after parsing).
+@dataclass
+class StageRun:
+    rows: int = None
+    seconds: float = 0.0
+    peak_rss_delta: int = None
+
+
+# Totals of all runs of one stage
+@dataclass
+class StageStats:
+    calls: int = 0
+    seconds: float = 0.0
+    last_seconds: float = 0.0
+    rows: int = 0
+    last_rows: int = None
+    peak_rss_delta: int = None
+
+    @property
+    def rows_per_second(self):
+        if not self.last_rows or not self.last_seconds:
+            return None
+        return self.last_rows / self.last_seconds
+
+
+# Function to escape a Prometheus label value
+def label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# Per-stage timings, memory and counters of one session (or one batch run)
+class PipelineMetrics:
+    def __init__(self, sample_memory=True):
+        self.sample_memory = sample_memory
+        self.stages = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        run = StageRun(rows)
+        sampler = RssSampler() if self.sample_memory else None
+        started = time.perf_counter()
+        try:
+            with sampler or nullcontext():
+                yield run
+        finally:
+            run.seconds = time.perf_counter() - started
+            run.peak_rss_delta = None if sampler is None else sampler.peak_delta
+            self.record(name, run)
+
+    def record(self, name, run):
+        with self.lock:
+            stats = self.stages.setdefault(name, StageStats())
+            stats.calls += 1
+            stats.seconds += run.seconds
+            stats.last_seconds = run.seconds
+            stats.last_rows = run.rows
+            stats.rows += run.rows or 0
+            if run.peak_rss_delta is not None:
+                stats.peak_rss_delta = max(stats.peak_rss_delta or 0, run.peak_rss_delta)
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + int(value)
+
+    def reset(self):
+        with self.lock:
+            self.stages.clear()
+            self.counters.clear()
+
+    def merge(self, other):
+        # Add the stages and counters of another run, e.g. of a worker process
+        with self.lock:
+            for name, theirs in other.stages.items():
+                stats = self.stages.setdefault(name, StageStats())
+                stats.calls += theirs.calls
+                stats.seconds += theirs.seconds
+                stats.rows += theirs.rows
+                stats.last_seconds, stats.last_rows = theirs.last_seconds, theirs.last_rows
+                if theirs.peak_rss_delta is not None:
+                    stats.peak_rss_delta = max(stats.peak_rss_delta or 0, theirs.peak_rss_delta)
+            for name, value in other.counters.items():
+                self.counters[name] = self.counters.get(name, 0) + value
+        return self
+
+    # The lock cannot be pickled, so metrics are sent between processes without it
+    def __getstate__(self):
+        state = vars(self).copy()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        vars(self).update(state)
+        self.lock = threading.Lock()
+
+    def frame(self):
+        # One row per stage, in the order the stages first ran
+        with self.lock:
+            items = list(self.stages.items())
+        return pd.DataFrame({
+            'stage': [name for name, _ in items],
+            'calls': [stats.calls for _, stats in items],
+            'last_seconds': [stats.last_seconds for _, stats in items],
+            'total_seconds': [stats.seconds for _, stats in items],
+            'rows_per_second': [stats.rows_per_second for _, stats in items],
+            'peak_rss_delta_mb': [None if stats.peak_rss_delta is None else stats.peak_rss_delta / 2**20
+                                  for _, stats in items],
+        })
+
+    def to_dict(self):
+        with self.lock:
+            stages = {name: StageStats(**vars(stats)) for name, stats in self.stages.items()}
+            counters = dict(self.counters)
+        return {
+            'stages': [
+                {
+                    'stage': name,
+                    'calls': stats.calls,
+                    'seconds_total': round(stats.seconds, 6),
+                    'last_seconds': round(stats.last_seconds, 6),
+                    'rows_total': stats.rows,
+                    'last_rows': stats.last_rows,
+                    'rows_per_second': None if stats.rows_per_second is None else round(stats.rows_per_second),
+                    'peak_rss_delta_bytes': stats.peak_rss_delta,
+                }
+                for name, stats in stages.items()
+            ],
+            'counters': counters,
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2)
+
+    def to_prometheus(self, prefix=METRICS_PREFIX):
+        # Text exposition format, e.g. for node_exporter's textfile collector
+        data = self.to_dict()
+        families = [
+            ('stage_calls_total', 'counter', "Runs of each pipeline stage", 'calls'),
+            ('stage_seconds_total', 'counter', "Wall time spent in each pipeline stage", 'seconds_total'),
+            ('stage_rows_total', 'counter', "Rows processed by each pipeline stage", 'rows_total'),
+            ('stage_last_seconds', 'gauge', "Wall time of the last run of each pipeline stage", 'last_seconds'),
+            ('stage_rows_per_second', 'gauge', "Throughput of the last run of each pipeline stage",
+             'rows_per_second'),
+            ('stage_peak_rss_delta_bytes', 'gauge', "Largest resident memory growth during a pipeline stage",
+             'peak_rss_delta_bytes'),
+        ]
+        lines = []
+        for suffix, kind, description, field in families:
+            samples = [(stage['stage'], stage[field]) for stage in data['stages'] if stage[field] is not None]
+            if not samples:
+                continue
+            lines += [f"# HELP {prefix}_{suffix} {description}.", f"# TYPE {prefix}_{suffix} {kind}"]
+            lines += [f'{prefix}_{suffix}{{stage="{label_value(stage)}"}} {value}' for stage, value in samples]
+        for name, value in data['counters'].items():
+            lines += [f"# TYPE {prefix}_{name}_total counter", f"{prefix}_{name}_total {value}"]
+        return '\n'.join(lines) + '\n'
+
+
+# Function to write metrics in the Prometheus text format, replacing the file atomically
+# so that a collector never reads a half-written file
+def write_prometheus(metrics, path, prefix=METRICS_PREFIX):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as handle:
+        handle.write(metrics.to_prometheus(prefix))
+    os.replace(tmp_path, path)
+    return path
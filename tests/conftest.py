@@ -0,0 +1,6 @@
+import sys
+from pathlib import Path
+
+# The app's modules live in the repository root, the log generator in benchmarks/
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT), str(ROOT / 'benchmarks')]
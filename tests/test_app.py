@@ -0,0 +1,65 @@
+"""The dashboard reuses its chart images and shared caches across reruns and sessions."""
+from pathlib import Path
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+APP = str(Path(__file__).resolve().parent.parent / 'app.py')
+
+
+@pytest.fixture
+def app(tmp_path_factory, monkeypatch):
+    monkeypatch.setenv('LOG_CACHE_DIR', str(tmp_path_factory.mktemp('cache')))
+    at = AppTest.from_file(APP, default_timeout=120)
+    at.run()
+    assert not at.exception
+    return at
+
+
+def counters(at):
+    return dict(at.session_state["pipeline_metrics"].counters)
+
+
+def element_types(at):
+    return [element.type for element in at.main]
+
+
+def test_chart_images_are_rendered_once(app):
+    first = counters(app)
+    rendered = first.get('chart_cache_hits', 0) + first.get('chart_cache_misses', 0)
+    assert rendered == element_types(app).count('image') > 0
+    app.run()
+    second = counters(app)
+    assert second.get('chart_cache_misses', 0) == first.get('chart_cache_misses', 0)
+    assert second['chart_cache_hits'] == first.get('chart_cache_hits', 0) + rendered
+
+
+def test_vega_lite_backend_draws_charts_in_the_browser(app):
+    images = element_types(app).count('image')
+    before = counters(app)
+    backend = next(box for box in app.sidebar.selectbox if box.label == "Chart Backend")
+    backend.set_value("Vega-Lite (rendered in the browser)").run()
+    assert not app.exception
+    types = element_types(app)
+    assert 'image' not in types and types.count('vega_lite_chart') == images
+    after = counters(app)
+    assert [after.get(name, 0) for name in ['chart_cache_hits', 'chart_cache_misses']] == [
+        before.get(name, 0) for name in ['chart_cache_hits', 'chart_cache_misses']]
+
+
+def memory_budget(at):
+    return next(box for box in at.sidebar.number_input if box.label == "Memory budget (MB)")
+
+
+def test_cache_budget_is_shared_and_only_set_on_change(app):
+    original = memory_budget(app).value
+    memory_budget(app).set_value(original + 64).run()
+    try:
+        # Other sessions start from the shared budget, and their reruns leave it alone
+        for _ in range(2):
+            other = AppTest.from_file(APP, default_timeout=120)
+            other.run()
+            other.run()
+            assert memory_budget(other).value == original + 64
+    finally:
+        memory_budget(app).set_value(original).run()
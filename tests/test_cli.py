@@ -0,0 +1,54 @@
+"""Each log gets its own report directory, and bad paths are rejected up front."""
+import json
+
+import pytest
+
+from cli import main, parse_args, report_names
+
+LINE = '10.0.0.1 - - [01/Jan/2024:00:00:00 +0000] "GET / HTTP/1.1" 200 1 "-" "agent"\n'
+
+
+def test_report_names_are_unique():
+    assert report_names(['/a/x/access.log', '/a/y/access.log', 'b.log', '-']) == [
+        'x_access.log', 'y_access.log', 'b.log', 'stdin']
+    assert report_names(['/v/combined', '/w/b.log'], reserved=['combined']) == ['v_combined', 'b.log']
+    names = report_names(['/v/x/a.log', '/w/x/a.log'])
+    assert len(set(names)) == 2
+
+
+def test_same_basenames_and_combined_keep_separate_reports(tmp_path):
+    logs = []
+    for parent, count in [('one', 1), ('two', 2), ('three', 3)]:
+        name = 'combined' if parent == 'three' else 'access.log'
+        (tmp_path / parent).mkdir()
+        logs.append(tmp_path / parent / name)
+        logs[-1].write_text(LINE * count)
+    output = tmp_path / 'reports'
+    assert main([*map(str, logs), '--combined', '-o', str(output)]) == 0
+    totals = {
+        directory.name: json.loads((directory / 'summary.json').read_text())['overview']['total_requests']
+        for directory in output.iterdir()
+    }
+    assert totals == {'one_access.log': 1, 'two_access.log': 2, 'three_combined': 3, 'combined': 6}
+
+
+def test_missing_log_is_a_usage_error(tmp_path, capsys):
+    with pytest.raises(SystemExit) as raised:
+        parse_args([str(tmp_path / 'missing.log')])
+    assert raised.value.code == 2
+    assert 'no such file' in capsys.readouterr().err
+
+
+def test_metrics_file_has_the_stages_of_every_log(tmp_path):
+    logs = []
+    for name in ['a.log', 'b.log']:
+        logs.append(tmp_path / name)
+        logs[-1].write_text(LINE * 2 + 'not a log line\n')
+    metrics_file = tmp_path / 'weblog.prom'
+    argv = [*map(str, logs), '--combined', '-o', str(tmp_path / 'reports'), '--metrics-file', str(metrics_file)]
+    assert main(argv) == 0
+    text = metrics_file.read_text()
+    assert 'weblog_stage_calls_total{stage="load: decode and parse"} 2' in text
+    assert 'weblog_stage_calls_total{stage="aggregate: merge"} 1' in text
+    assert 'weblog_parsed_lines_total 4' in text
+    assert 'weblog_unparsed_lines_total 2' in text
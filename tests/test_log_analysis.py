@@ -0,0 +1,39 @@
+"""Count tables merged across appended rows match counting all rows at once, and bot
+verdicts are memoized within a bound."""
+import pandas as pd
+
+from log_analysis import BotClassifier, build_aggregates
+from log_parser import parse_logs
+
+LINE = '10.0.0.{ip} - - [01/Jan/2024:00:{minute:02d}:00 +0000] "GET {url} HTTP/1.1" 200 1 "-" "agent {ip}"'
+
+
+def test_merge_matches_full_count_with_first_seen_ties():
+    urls = ['/zeta', '/alpha', '/zeta', '/mid', '/beta', '/mid', '/omega', '/alpha']
+    lines = [LINE.format(ip=index % 3, minute=index, url=url) for index, url in enumerate(urls)]
+    full = build_aggregates(parse_logs('\n'.join(lines)))
+    for split in range(1, len(lines)):
+        merged = build_aggregates(parse_logs('\n'.join(lines[:split]))).merge(
+            build_aggregates(parse_logs('\n'.join(lines[split:])))
+        )
+        for name in ['url_counts', 'ip_counts', 'method_counts', 'user_agent_counts']:
+            pd.testing.assert_series_equal(getattr(merged, name), getattr(full, name))
+    assert list(full.url_counts.index) == ['/zeta', '/alpha', '/mid', '/beta', '/omega']
+
+
+def test_aggregates_without_exact_counts_leave_out_urls_and_ips():
+    lines = [LINE.format(ip=index % 3, minute=index, url=f'/{index % 2}') for index in range(6)]
+    parts = [build_aggregates(parse_logs('\n'.join(part)), exact_counts=False) for part in (lines[:4], lines[4:])]
+    merged = parts[0].merge(parts[1])
+    assert merged.url_counts is None and merged.ip_counts is None
+    full = build_aggregates(parse_logs('\n'.join(lines)))
+    pd.testing.assert_series_equal(merged.method_counts, full.method_counts)
+    assert merged.total_requests == full.total_requests
+
+
+def test_bot_verdicts_stay_within_their_bound():
+    classifier = BotClassifier(max_verdicts=3)
+    user_agents = pd.Series([f'agent {index}' for index in range(5)] + ['Googlebot/2.1'])
+    assert list(classifier.classify(user_agents)) == [False] * 5 + [True]
+    assert len(classifier.verdicts) <= 3
+    assert list(classifier.classify(user_agents.astype('category'))) == [False] * 5 + [True]
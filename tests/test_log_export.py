@@ -0,0 +1,66 @@
+"""Exports go to their own directory, where old files are cleaned up, and have the same
+columns whether they are written from memory or from the log store."""
+import os
+import time
+
+import pandas as pd
+import pytest
+
+from log_analysis import BotClassifier, derive_export_columns
+from log_export import export_to_file, prune_exports
+from log_parser import parse_logs
+from log_store import LogStore, default_store_path
+
+LINE = '10.0.0.1 - - [01/Jan/2024:00:00:00 +0000] "GET / HTTP/1.1" 200 1 "-" "agent"'
+
+
+def test_export_prunes_old_files(tmp_path):
+    stale, recent = tmp_path / 'old.csv', tmp_path / 'recent.csv'
+    stale.write_text('old')
+    recent.write_text('recent')
+    hour_ago = time.time() - 7200
+    os.utime(stale, (hour_ago, hour_ago))
+
+    path = export_to_file(parse_logs(LINE), "CSV", directory=tmp_path)
+    assert os.path.dirname(path) == str(tmp_path)
+    assert sorted(entry.name for entry in tmp_path.iterdir()) == sorted([os.path.basename(path), 'recent.csv'])
+
+    prune_exports(tmp_path, max_age=0)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_store_export_matches_in_memory_export(tmp_path):
+    log = '\n'.join([
+        LINE,
+        LINE.replace('200', '404').replace('"agent"', '"Googlebot/2.1"'),
+        LINE.replace('10.0.0.1', '10.0.0.2').replace('200', '503'),
+    ])
+    classifier = BotClassifier()
+    store = LogStore(default_store_path(tmp_path, 'sqlite'), 'sqlite')
+    try:
+        store.ingest(log, 'a', 'a.log')
+        frames = (derive_export_columns(frame, classifier) for frame in store.iter_frames(2))
+        store_export = pd.read_csv(export_to_file(frames, "CSV", directory=tmp_path))
+    finally:
+        store.close()
+    memory_export = pd.read_csv(export_to_file(
+        derive_export_columns(parse_logs(log), classifier), "CSV", directory=tmp_path
+    ))
+    assert list(store_export['is_bot']) == [False, True, False]
+    assert list(store_export['status_type']) == ['success', 'client_error', 'server_error']
+    pd.testing.assert_frame_equal(store_export, memory_export)
+
+
+@pytest.mark.parametrize('csv_format', ["CSV", "CSV (gzip)"])
+def test_csv_and_parquet_exports_hold_the_same_rows(tmp_path, csv_format):
+    pytest.importorskip('pyarrow')
+    log = '\n'.join(
+        LINE.replace('+0000', '+0530').replace('/ ', f'/page{index} ').replace('200 1', f'{200 + index * 100} {index}')
+        for index in range(5)
+    )
+    df = derive_export_columns(parse_logs(log), BotClassifier())
+    csv = pd.read_csv(export_to_file(df, csv_format, chunk_rows=2, directory=tmp_path))
+    parquet = pd.read_parquet(export_to_file(df, "Parquet", chunk_rows=2, directory=tmp_path))
+    assert len(parquet) == len(df) and str(parquet['datetime'].dt.tz) == str(df['datetime'].dt.tz)
+    # CSV holds text, so both are compared as the text they show
+    pd.testing.assert_frame_equal(csv.astype(str), parquet.astype(str))
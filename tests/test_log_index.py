@@ -0,0 +1,59 @@
+"""Filtering through the index selects the same rows as filtering the parsed log directly."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from generate_logs import generate_lines
+from log_analysis import BotClassifier, classify_status
+from log_index import LogFilter, LogIndex, epoch_ns
+from log_parser import parse_logs
+
+
+@pytest.fixture(scope='module')
+def df():
+    lines = [line for block in generate_lines(3_000, seed=3, offsets=(0, -300, 330), block_lines=1_000)
+             for line in block]
+    # Out of order rows, which the index sorts by time
+    return parse_logs('\n'.join(lines)).sample(frac=1, random_state=0).reset_index(drop=True)
+
+
+def expected_rows(df, filters, classifier):
+    rows = df.iloc[np.argsort(epoch_ns(df['datetime']), kind='stable')].reset_index(drop=True)
+    times = epoch_ns(rows['datetime'])
+    keep = np.ones(len(rows), dtype=bool)
+    if filters.start_ns is not None:
+        keep &= times >= filters.start_ns
+    if filters.end_ns is not None:
+        keep &= times < filters.end_ns
+    if filters.status_classes:
+        keep &= np.isin(np.asarray(classify_status(rows['status'])), filters.status_classes)
+    if filters.methods:
+        keep &= rows['method'].isin(filters.methods).to_numpy()
+    if filters.is_bot is not None:
+        keep &= np.array([classifier.is_bot(agent) for agent in rows['user_agent']]) == filters.is_bot
+    if filters.url_prefix:
+        keep &= rows['url'].astype(str).str.startswith(filters.url_prefix).to_numpy()
+    return rows[keep]
+
+
+def test_select_matches_direct_filtering(df):
+    classifier = BotClassifier()
+    index = LogIndex(df)
+    times = np.sort(epoch_ns(df['datetime']))
+    start_ns, end_ns = int(times[len(times) // 4]), int(times[len(times) * 3 // 4])
+    selections = [
+        LogFilter(),
+        LogFilter(start_ns=start_ns),
+        LogFilter(start_ns=start_ns, end_ns=end_ns),
+        LogFilter(end_ns=int(times[0])),
+        LogFilter(status_classes=('client_error', 'server_error')),
+        LogFilter(methods=('POST', 'PATCH')),
+        LogFilter(is_bot=True),
+        LogFilter(is_bot=False, url_prefix='/p/1'),
+        LogFilter(start_ns=start_ns, end_ns=end_ns, status_classes=('success',), methods=('GET',), is_bot=False,
+                  url_prefix='/p/'),
+    ]
+    # The second round reuses the masks built by the first
+    for filters in selections * 2:
+        pd.testing.assert_frame_equal(index.select(filters, classifier), expected_rows(df, filters, classifier))
+    assert len(index.select(selections[2], classifier)) > 0
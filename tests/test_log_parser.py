@@ -0,0 +1,172 @@
+"""Parity of the fast parsing paths with pandas and with each other."""
+import gzip
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from generate_logs import generate_lines
+from log_parser import PARSE_ENGINES, decode_timestamps, parse_logs, parse_logs_parallel, timestamp_columns
+
+TIMESTAMP_FORMAT = '%d/%b/%Y:%H:%M:%S %z'
+TIMESTAMPS = [
+    '10/Oct/2023:13:55:36 +0000',
+    '10/oct/2023:13:55:36 +0000',
+    '10/OCT/2023:13:55:36 -0700',
+    '10/oCt/2023:13:55:36 +0530',
+    '31/Dec/2023:23:59:59 +2359',
+    '31/Dec/2023:23:59:59 -2359',
+    '31/Dec/2023:23:59:60 +0000',
+    '31/Dec/2023:23:59:61 +0000',
+    '29/Feb/2024:00:00:00 +0000',
+    '29/Feb/2000:00:00:00 +0000',
+    '01/Jan/1970:00:00:00 +0000',
+    '01/Jan/1678:00:00:00 +0000',
+    '31/Dec/2261:23:59:59 +0000',
+    # Invalid
+    '29/Feb/2023:00:00:00 +0000',
+    '29/Feb/1900:00:00:00 +0000',
+    '31/Apr/2023:00:00:00 +0000',
+    '00/Jan/2023:00:00:00 +0000',
+    '10/Oct/2023:24:00:00 +0000',
+    '10/Oct/2023:13:60:00 +0000',
+    '10/Oct/2023:13:55:62 +0000',
+    '10/Oct/2023:13:55:36 +0099',
+    '10/Oct/2023:13:55:36 +2500',
+    '10/Oct/2023:13:55:36 *0000',
+    '10/Okt/2023:13:55:36 +0000',
+    '10/O@t/2023:13:55:36 +0000',
+    '10-Oct-2023:13:55:36 +0000',
+    '10/Oct/2023:13:55:36',
+    '10/Öct/2023:13:55:36 +000',
+    '',
+]
+# The decoder only reads the fixed-width form that servers write, while strptime
+# also accepts numbers without their leading zeros
+FIXED_WIDTH_ONLY = ['1/Oct/2023:13:55:36 +0000', '10/Oct/2023:1:55:36 +0000', '10/Oct/2023:13:55:36 +000']
+
+
+# Function to convert one timestamp with pandas, returning NaT where pandas rejects it
+def reference(value):
+    try:
+        return pd.to_datetime(value, format=TIMESTAMP_FORMAT)
+    except (ValueError, OverflowError):
+        return pd.NaT
+
+
+@pytest.mark.parametrize('value', TIMESTAMPS)
+def test_decode_timestamps_matches_pandas(value):
+    epoch, offsets, valid = decode_timestamps([value])
+    expected = reference(value)
+    assert bool(valid[0]) == (expected is not pd.NaT)
+    if valid[0]:
+        assert epoch[0] == expected.value
+        assert offsets[0] == expected.utcoffset().total_seconds() // 60
+
+
+@pytest.mark.parametrize('value', FIXED_WIDTH_ONLY)
+def test_decode_timestamps_requires_fixed_width(value):
+    assert not decode_timestamps([value])[2][0]
+
+
+def test_decode_timestamps_matches_pandas_on_random_dates():
+    rng = np.random.default_rng(0)
+    seconds = rng.integers(pd.Timestamp('1700-01-01').value // 10**9, pd.Timestamp('2250-01-01').value // 10**9,
+                           size=2000)
+    offsets = rng.integers(-23 * 60 - 59, 23 * 60 + 59, size=len(seconds))
+    values = [
+        (pd.Timestamp(second, unit='s', tz='UTC').tz_convert(f'{"-" if offset < 0 else "+"}'
+                                                              f'{abs(offset) // 60:02d}:{abs(offset) % 60:02d}')
+         .strftime(TIMESTAMP_FORMAT))
+        for second, offset in zip(seconds.tolist(), offsets.tolist())
+    ]
+    # Vary the case of the month names
+    values = [value[:3] + value[3:6].upper() + value[6:] if index % 3 == 1 else
+              value[:3] + value[3:6].lower() + value[6:] if index % 3 == 2 else value
+              for index, value in enumerate(values)]
+
+    epoch, decoded_offsets, valid = decode_timestamps(values)
+    assert valid.all()
+    np.testing.assert_array_equal(epoch, [reference(value).value for value in values])
+    np.testing.assert_array_equal(decoded_offsets, offsets)
+
+    # A single offset keeps that offset's time zone, mixed offsets fall back to UTC
+    datetimes, _ = timestamp_columns(epoch[:1], decoded_offsets[:1])
+    assert datetimes[0] == reference(values[0])
+    assert str(datetimes.dt.tz) == str(reference(values[0]).tz)
+    datetimes, _ = timestamp_columns(epoch, decoded_offsets)
+    assert str(datetimes.dt.tz) == 'UTC'
+
+
+@pytest.fixture(scope='module')
+def log_file(tmp_path_factory):
+    lines = [line for block in generate_lines(20_000, seed=1, malformed_share=0.01, offsets=(0, -300, 330),
+                                              block_lines=5_000)
+             for line in block]
+    lines += [
+        '\t10.0.0.1 - - [01/Jan/2024:00:00:00 +0000] "GET /tab HTTP/1.1" 200 1 "-" "-"',
+        '10.0.0.2 - - [01/jan/2024:00:00:00 +0000] "GET /lower HTTP/1.1" 200 1 "-" "curl/8.0"\r',
+        '10.0.0.3 - - [01/Jan/2024:00:00:00 +0099] "GET /offset HTTP/1.1" 200 1 "-" "-"',
+        '999.0.0.1 - - [01/Jan/2024:00:00:00 +0000] "GET /address HTTP/1.1" 200 1 "-" "-"',
+        '',
+    ]
+    path = tmp_path_factory.mktemp('logs') / 'access.log'
+    path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+    return path
+
+
+def assert_same_logs(left, right):
+    pd.testing.assert_frame_equal(left, right)
+    assert left.attrs == right.attrs
+
+
+def test_engines_match(log_file):
+    first, *others = [parse_logs(log_file, engine=engine) for engine in PARSE_ENGINES]
+    assert len(first) > 0 and first.attrs['unparsed_lines'] > 0
+    assert (first['url'] == '/lower').any()
+    assert not (first['url'] == '/offset').any()
+    for df in others:
+        assert_same_logs(first, df)
+
+
+@pytest.mark.parametrize('engine', list(PARSE_ENGINES))
+def test_parallel_matches_serial(log_file, engine):
+    chunk_size = 64 * 1024
+    serial = parse_logs(log_file, chunk_size, engine)
+    parallel = parse_logs_parallel(log_file, workers=2, chunk_size=chunk_size, engine=engine)
+    assert_same_logs(serial, parallel)
+
+
+@pytest.mark.parametrize('chunk_size', [997, 64 * 1024])
+def test_gzip_and_chunk_boundaries_match_whole_file(log_file, tmp_path, chunk_size):
+    data = b''.join(log_file.read_bytes().splitlines(keepends=True)[-2_000:])
+    path = tmp_path / 'access.log'
+    path.write_bytes(data)
+    whole = parse_logs(data.decode('utf-8'))
+    assert_same_logs(parse_logs(path, chunk_size), whole)
+    # Rotated logs may hold several gzip members, and chunks cut through lines and members
+    middle = data.index(b'\n', len(data) // 2) - 10
+    compressed = tmp_path / 'access.log.gz'
+    compressed.write_bytes(gzip.compress(data[:middle]) + gzip.compress(data[middle:]))
+    assert_same_logs(parse_logs(compressed, chunk_size), whole)
+    with open(compressed, 'rb') as stream:
+        assert_same_logs(parse_logs(stream, chunk_size), whole)
+
+
+def test_last_line_without_newline_is_parsed(log_file, tmp_path):
+    lines = log_file.read_text(encoding='utf-8').splitlines()[:50]
+    path = tmp_path / 'access.log'
+    path.write_text('\n'.join(lines))
+    assert_same_logs(parse_logs(path, chunk_size=100), parse_logs('\n'.join(lines)))
+
+
+@pytest.mark.parametrize('engine', list(PARSE_ENGINES))
+def test_oversized_size_only_skips_its_line(tmp_path, engine):
+    line = '10.0.0.1 - - [01/Jan/2024:00:00:00 +0000] "GET / HTTP/1.1" 200 {} "-" "agent"'
+    text = '\n'.join(line.format(size) for size in ['5', '99999999999999999999', '-', '999999999999999999'])
+    df = parse_logs(text, engine=engine)
+    assert df['size'].tolist() == [5, 0, 999999999999999999]
+    assert df.attrs['unparsed_lines'] == 1
+    path = tmp_path / 'access.log'
+    path.write_text(text + '\n')
+    assert_same_logs(df, parse_logs_parallel(path, workers=2, engine=engine))
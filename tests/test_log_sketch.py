@@ -0,0 +1,13 @@
+"""Sketch chunks are counted from their own values."""
+import pandas as pd
+
+from log_sketch import count_chunk
+
+
+def test_count_chunk_ignores_unused_categories():
+    categories = [f'/{number}' for number in range(1000)] + ['/a', '/b', '/c']
+    column = pd.Series(pd.Categorical(['/b', '/a', '/b', '/c'], categories=categories), name='url')
+    counts = count_chunk(column)
+    assert counts.to_dict() == {'/b': 2, '/a': 1, '/c': 1}
+    assert list(counts.index) == ['/b', '/a', '/c']
+    assert counts.index.name == 'url'
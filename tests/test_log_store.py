@@ -0,0 +1,35 @@
+"""The log store's key and the time zone of its rows stay consistent."""
+import pytest
+
+from log_store import HAS_DUCKDB, LogStore, default_store_path
+
+LINE = '10.0.0.1 - - [01/Jan/2024:00:0{minute}:00 {offset}] "GET / HTTP/1.1" 200 1 "-" "agent"\n'
+BACKENDS = ['sqlite'] + (['duckdb'] if HAS_DUCKDB else [])
+
+
+@pytest.fixture(params=BACKENDS)
+def store(tmp_path, request):
+    log_store = LogStore(default_store_path(tmp_path, request.param), request.param)
+    yield log_store
+    log_store.close()
+
+
+def test_key_changes_after_clear_and_same_ingest(store):
+    log = LINE.format(minute=0, offset='+0000')
+    store.ingest(log, 'a', 'a.log')
+    before = store.key
+    store.clear()
+    assert store.key != before
+    store.ingest(log, 'a', 'a.log')
+    assert store.key != before
+
+
+def test_frames_share_the_store_time_zone(store):
+    store.ingest(''.join(LINE.format(minute=minute, offset='+0530') for minute in range(3)), 'a', 'a.log')
+    assert [str(frame['datetime'].dt.tz) for frame in store.iter_frames(2)] == ['UTC+05:30', 'UTC+05:30']
+    store.ingest(LINE.format(minute=5, offset='-0300'), 'b', 'b.log')
+    # One chunk still has a single offset, but all chunks are shown in UTC once the stored offsets differ
+    frames = list(store.iter_frames(3))
+    assert [str(frame['datetime'].dt.tz) for frame in frames] == ['UTC', 'UTC']
+    assert str(store.head(1)['datetime'].dt.tz) == 'UTC'
+    assert str(store.time_bounds()[0].tz) == 'UTC'
@@ -0,0 +1,61 @@
+"""A live tail matches parsing the whole file at once."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from generate_logs import generate_lines
+from log_analysis import BotClassifier, build_aggregates
+from log_index import LogFilter, LogIndex
+from log_parser import parse_logs
+from log_tail import LogTail
+
+
+@pytest.mark.parametrize('offsets', [(0,), (330,), (0, -300, 330)])
+def test_tail_matches_full_parse(tmp_path, offsets):
+    lines = [line for block in generate_lines(6_000, seed=2, malformed_share=0.01, offsets=offsets, block_lines=1_000)
+             for line in block]
+    path = tmp_path / 'access.log'
+    tail = LogTail(path, chunk_size=4096)
+    cuts = [0, 1, 700, 701, 2_500, 4_000, len(lines)]
+    with open(path, 'w') as handle:
+        for start, end in zip(cuts[:-1], cuts[1:]):
+            handle.write(''.join(line + '\n' for line in lines[start:end]))
+            handle.flush()
+            tail.refresh()
+            index = tail.index()
+
+    full = parse_logs(path)
+    expected = LogIndex(full)
+    # The tail keeps categories of rows that were rejected after interning
+    pd.testing.assert_frame_equal(tail.frame(), expected.df, check_categorical=False)
+    assert tail.frame().attrs == full.attrs
+    np.testing.assert_array_equal(index.times, expected.times)
+
+    aggregates = build_aggregates(full)
+    for name in ['url_counts', 'ip_counts', 'method_counts', 'user_agent_counts', 'status_counts', 'hourly_counts',
+                 'size_counts']:
+        pd.testing.assert_series_equal(getattr(tail.aggregates, name), getattr(aggregates, name))
+    assert tail.aggregates.total_requests == aggregates.total_requests
+
+    times = expected.times
+    filters = LogFilter(start_ns=int(times[len(times) // 4]), end_ns=int(times[-len(times) // 4]),
+                        status_classes=('success', 'client_error'), methods=('GET',), is_bot=False, url_prefix='/p/1')
+    classifier = BotClassifier()
+    pd.testing.assert_frame_equal(index.select(filters, classifier).reset_index(drop=True),
+                                  expected.select(filters, classifier).reset_index(drop=True), check_categorical=False)
+
+
+def test_tail_moves_hours_to_utc_when_offsets_mix(tmp_path):
+    local = [line for block in generate_lines(300, seed=3, offsets=(330,)) for line in block]
+    mixed = [line for block in generate_lines(300, seed=4, offsets=(0, -300), start='2024-01-01T00:10:00')
+             for line in block]
+    path = tmp_path / 'access.log'
+    tail = LogTail(path)
+    with open(path, 'w') as handle:
+        for lines in (local, mixed):
+            handle.write(''.join(line + '\n' for line in lines))
+            handle.flush()
+            tail.refresh()
+            full = parse_logs(path)
+            pd.testing.assert_series_equal(tail.aggregates.hourly_counts, build_aggregates(full).hourly_counts)
+            assert str(tail.frame()['hour'].dt.tz) == str(full['hour'].dt.tz)